@@ -1,10 +1,20 @@
+import asyncio
 import os
+import random
+import uuid
+from contextlib import asynccontextmanager
+import orjson
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from fastapi.responses import ORJSONResponse, Response
 from .config import get_settings
 from .routers import chat, progress, resources, pdf, auth, planner, notes, audio, ocr, pyq, flashcards, gamification
+from .services.points import points_flush_loop
+from .utils.cache import get_redis
+from .utils.context import request_id_var
 from .utils.logger import setup_logger, log_api_call, log_error, log_success
+from .utils.supabase_client import get_supabase_client
 import time
 
 # Initialize logger
@@ -12,10 +22,46 @@ logger = setup_logger()
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_success("🚀 CodeMentor AI Backend starting up", "Startup")
+
+    # Warm process-wide singletons so the first request doesn't pay their
+    # construction cost; a missing key shouldn't keep the app from starting
+    try:
+        get_supabase_client()
+        audio.get_audio_service()
+    except Exception as e:
+        log_error(e, "Startup warmup")
+
+    # Derived from the actual route table so the listing can't drift from
+    # the routers that are really mounted
+    paths = sorted({route.path for route in app.routes if isinstance(route, APIRoute)})
+    logger.info("📊 Available endpoints:\n  - {}", "\n  - ".join(paths))
+
+    # Drain buffered point awards into the database in the background;
+    # only needed when Redis buffering is active
+    flush_task = asyncio.create_task(points_flush_loop()) if get_redis() is not None else None
+
+    yield
+
+    if flush_task is not None:
+        flush_task.cancel()
+        try:
+            await flush_task
+        except asyncio.CancelledError:
+            pass
+
+    log_success("🛑 CodeMentor AI Backend shutting down", "Shutdown")
+
+
 app = FastAPI(
     title=settings.app_name,
     description="CodeMentor AI - Your AI Study Companion",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -25,46 +71,108 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=list(settings.cors_allow_methods),
+    allow_headers=list(settings.cors_allow_headers),
+    max_age=settings.cors_max_age,
 )
 
+# Paths hammered by liveness probes and load balancers; only a sampled
+# fraction of their requests is logged
+_SAMPLED_PATHS = frozenset({"/health", "/"})
+
+
 # Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Log incoming request
-    log_api_call(
-        endpoint=request.url.path,
-        method=request.method,
-        user_id=request.headers.get("authorization", "anonymous")[:20]
-    )
-    
-    response = await call_next(request)
-    
-    # Log response time
-    process_time = time.time() - start_time
-    logger.info(f"⏱️ Request completed in {process_time:.3f}s - Status: {response.status_code}")
-    
-    return response
+# Implemented as a raw ASGI middleware instead of @app.middleware("http") so
+# requests are not funneled through Starlette's BaseHTTPMiddleware, which adds
+# a task group and body buffering per request.
+class RequestLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] in _SAMPLED_PATHS and random.random() > settings.log_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        # A request id ties all log lines for this request together;
+        # no auth material is read or logged here
+        request_token = request_id_var.set(uuid.uuid4().hex)
+
+        # Log incoming request
+        log_api_call(
+            endpoint=scope["path"],
+            method=scope["method"]
+        )
+
+        start_time = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Log response time and size per route
+            process_time = time.perf_counter() - start_time
+            logger.info(
+                "⏱️ {} completed in {:.3f}s - Status: {} - {} bytes",
+                scope["path"], process_time, status_code, response_bytes,
+            )
+            request_id_var.reset(request_token)
+
+
+app.add_middleware(RequestLogMiddleware)
+
+# Opt-in request profiling: set ENABLE_PROFILING=1 and append ?profile=1
+# to any request to get a pyinstrument flamegraph of where the time went
+# (validation vs DB vs serialization). Never registered in normal runs,
+# so production requests pay nothing for it.
+if os.getenv("ENABLE_PROFILING") == "1":
+    from pyinstrument import Profiler
+    from fastapi.responses import HTMLResponse
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile"):
+            profiler = Profiler(interval=0.001, async_mode="enabled")
+            profiler.start()
+            await call_next(request)
+            profiler.stop()
+            return HTMLResponse(profiler.output_html())
+        return await call_next(request)
+
+# Encoded once; the body never changes, so 500s don't pay a JSON-encode
+# pass while an upstream outage makes them spike
+_ERR_500_BYTES = orjson.dumps({
+    "error": "Internal server error",
+    "message": "An unexpected error occurred. Please try again later.",
+    "status": "error"
+})
+
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     log_error(exc, f"Global exception handler - {request.url.path}")
-    return JSONResponse(
+    return Response(
+        content=_ERR_500_BYTES,
         status_code=500,
-        content={
-            "error": "Internal server error",
-            "message": "An unexpected error occurred. Please try again later.",
-            "status": "error"
-        }
+        media_type="application/json"
     )
 
 @app.get("/health")
 def health():
-    log_success("Health check requested", "HealthEndpoint")
     return {
         "status": "ok",
         "message": "CodeMentor AI Backend is running",
@@ -97,43 +205,20 @@ app.include_router(pyq.router)
 app.include_router(flashcards.router)
 app.include_router(gamification.router)
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    log_success("🚀 CodeMentor AI Backend starting up", "Startup")
-    logger.info("📊 Available endpoints:")
-    logger.info("  - Auth: /api/auth/*")
-    logger.info("  - Chat: /api/chat/*")
-    logger.info("  - Progress: /api/progress/*")
-    logger.info("  - Resources: /api/resources/*")
-    logger.info("  - PDF: /api/pdf/*")
-    logger.info("  - Planner: /api/planner/*")
-    logger.info("  - Notes: /api/notes/*")
-    logger.info("  🎤 Audio Transcription: /api/audio/*")
-    logger.info("  📄 OCR: /api/ocr/*")
-    logger.info("  🎯 PYQ Practice: /api/pyq/*")
-    logger.info("  🎴 Flashcards: /api/flashcards/*")
-    logger.info("  🏆 Gamification: /api/gamification/*")
-    logger.info("  - Health: /health")
-    logger.info("  - Docs: /docs")
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    log_success("🛑 CodeMentor AI Backend shutting down", "Shutdown")
-
-
-def get_uvicorn_host_port():
+def get_uvicorn_kwargs():
     h = "0.0.0.0"
     env_port = os.getenv("PORT")
     try:
         p = int(env_port) if env_port else int(settings.port)
     except (TypeError, ValueError):
         p = int(settings.port)
-    return h, p
+    # uvicorn refuses reload with multiple workers, so reload only applies
+    # to single-worker debug runs
+    workers = max(1, int(settings.workers))
+    reload = settings.debug and workers == 1
+    return {"host": h, "port": p, "workers": workers, "reload": reload}
 
 
 if __name__ == "__main__":
     import uvicorn
-    host_val, port_val = get_uvicorn_host_port()
-    uvicorn.run("backend_py.app_main:app", host=host_val, port=port_val, reload=True)
+    uvicorn.run("backend_py.app_main:app", **get_uvicorn_kwargs())
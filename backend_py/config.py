@@ -2,8 +2,7 @@
 Configuration settings for the CodeMentor AI Backend
 """
 import os
-from functools import lru_cache
-from typing import List
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,14 +13,28 @@ class Settings(BaseSettings):
     app_name: str = "CodeMentor AI Backend"
     port: int = 8000
     debug: bool = False
+
+    # Fraction of requests to high-traffic paths (health probes, root)
+    # that get request logs; everything else is always logged
+    log_sample_rate: float = 0.1
+
+    # Uvicorn worker processes; follows the conventional WEB_CONCURRENCY
+    # env var used by most PaaS providers
+    workers: int = int(os.getenv("WEB_CONCURRENCY", "1"))
     
     # CORS - stored as string, converted to list via property
     cors_origins_str: str = "http://localhost:5173,http://localhost:3000,http://127.0.0.1:5173"
     
-    @property
-    def cors_origins(self) -> List[str]:
-        """Parse CORS origins from comma-separated string"""
-        return [origin.strip() for origin in self.cors_origins_str.split(",")]
+    @cached_property
+    def cors_origins(self) -> tuple[str, ...]:
+        """Parse CORS origins from comma-separated string (once per instance)"""
+        return tuple(origin.strip() for origin in self.cors_origins_str.split(","))
+
+    # Explicit method/header allow-lists instead of "*" so browsers can
+    # cache preflight responses; max_age controls how long they do
+    cors_allow_methods: tuple = ("GET", "POST", "PUT", "DELETE", "OPTIONS")
+    cors_allow_headers: tuple = ("authorization", "content-type")
+    cors_max_age: int = 86400
     
     # Supabase
     supabase_url: str = ""
@@ -1,18 +1,66 @@
+import hashlib
+import threading
+import time
+
+import jwt as pyjwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from supabase import Client
 from ..utils.supabase_client import get_supabase_client
 
 security = HTTPBearer(auto_error=True)
 
+# Short-lived cache of resolved tokens so each authenticated request does not
+# pay a Supabase auth round-trip. Keyed by a digest of the JWT; the 60s TTL
+# keeps revoked/expired tokens from lingering.
+_user_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+_user_cache_lock = threading.Lock()
+
+
+def get_supabase() -> Client:
+    """FastAPI dependency that yields the cached process-wide Supabase client"""
+    return get_supabase_client()
+
+
+def _token_expiry(token: str):
+    """Read exp from the JWT payload without verifying the signature.
+
+    Only used to decide whether a cached entry is still fresh; the cache is
+    keyed by a digest of the whole token, so a forged token can never hit an
+    entry created by a genuine one. Returns None when undecodable.
+    """
+    try:
+        claims = pyjwt.decode(token, options={"verify_signature": False})
+        return claims.get("exp")
+    except Exception:
+        return None
+
 
 def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     jwt = creds.credentials
+    cache_key = hashlib.blake2b(jwt.encode(), digest_size=16).digest()
+    exp = _token_expiry(jwt)
+
+    # Tokens within 30s of their exp claim are re-validated against
+    # Supabase rather than served from cache
+    if exp is None or exp > time.time() + 30:
+        with _user_cache_lock:
+            cached = _user_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     supabase = get_supabase_client()
     try:
         res = supabase.auth.get_user(jwt)
         user = res.user
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return {"id": user.id, "email": user.email}
+        resolved = {"id": user.id, "email": user.email}
+        with _user_cache_lock:
+            _user_cache[cache_key] = resolved
+        return resolved
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
@@ -5,31 +5,44 @@ Handles audio file uploads and transcription
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
 from typing import Optional
+from functools import lru_cache
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 from ..schemas import (
     AudioTranscriptionRequest,
     AudioTranscriptionResponse
 )
+from supabase import Client
+
 from ..services.audio_service import AudioTranscriptionService
-from ..dependencies.auth import get_current_user
-from ..utils.supabase_client import get_supabase_client
+from ..dependencies.auth import get_current_user, get_supabase
+from ..utils.supabase_client import run_db
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/audio", tags=["audio-transcription"])
 
-# Initialize service
-audio_service = AudioTranscriptionService()
+# Accepted upload extensions, hoisted to module level so validation is a
+# single hash lookup per request
+_ALLOWED_AUDIO_EXTS = frozenset({".mp3", ".wav", ".m4a", ".ogg", ".webm", ".flac"})
+_ALLOWED_AUDIO_EXTS_STR = ", ".join(sorted(_ALLOWED_AUDIO_EXTS))
+
+
+@lru_cache(maxsize=1)
+def get_audio_service() -> AudioTranscriptionService:
+    """Lazily create the transcription service on first use"""
+    return AudioTranscriptionService()
 
 
 @router.get("/health")
-async def check_audio_service_health():
+async def check_audio_service_health(
+    audio_service: AudioTranscriptionService = Depends(get_audio_service)
+):
     """Check if audio transcription service is configured"""
     is_healthy = audio_service.check_service_health()
-    
+
     return {
         "status": "healthy" if is_healthy else "unhealthy",
         "service": "AssemblyAI",
@@ -44,7 +57,9 @@ async def transcribe_audio_file(
     subject: str = Form("General"),
     topic: str = Form("Lecture Notes"),
     auto_save_as_note: bool = Form(True),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase),
+    audio_service: AudioTranscriptionService = Depends(get_audio_service)
 ):
     """
     Transcribe an audio file to text
@@ -54,18 +69,17 @@ async def transcribe_audio_file(
     - **topic**: Specific topic of the audio
     - **auto_save_as_note**: Automatically save transcription as a note
     """
-    logger.info(f"Transcription request from user {current_user['id']} for file: {audio_file.filename}")
+    logger.info("Transcription request from user {} for file: {}", current_user['id'], audio_file.filename)
     
     try:
         # Validate file type
-        allowed_extensions = ['.mp3', '.wav', '.m4a', '.ogg', '.webm', '.flac']
         file_ext = os.path.splitext(audio_file.filename)[1].lower()
-        
-        if file_ext not in allowed_extensions:
-            logger.warning(f"Invalid file type: {file_ext}")
+
+        if file_ext not in _ALLOWED_AUDIO_EXTS:
+            logger.warning("Invalid file type: {}", file_ext)
             raise HTTPException(
                 status_code=400,
-                detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                detail=f"Invalid file type. Allowed: {_ALLOWED_AUDIO_EXTS_STR}"
             )
         
         # Create temp directory if it doesn't exist
@@ -76,11 +90,13 @@ async def transcribe_audio_file(
         temp_file_id = str(uuid.uuid4())
         temp_file_path = os.path.join(temp_dir, f"{temp_file_id}{file_ext}")
         
+        # Stream to disk in 1 MiB chunks instead of buffering the whole
+        # upload in memory
         with open(temp_file_path, "wb") as buffer:
-            content = await audio_file.read()
-            buffer.write(content)
+            while chunk := await audio_file.read(1024 * 1024):
+                buffer.write(chunk)
         
-        logger.info(f"Audio file saved temporarily: {temp_file_path}")
+        logger.info("Audio file saved temporarily: {}", temp_file_path)
         
         # Transcribe audio
         transcription_result = await audio_service.transcribe_audio(
@@ -90,10 +106,11 @@ async def transcribe_audio_file(
         
         # Generate transcription ID
         transcription_id = str(uuid.uuid4())
-        
+
+        # One timestamp for the transcription row and the optional note
+        now_iso = datetime.now(timezone.utc).isoformat()
+
         # Save to database
-        supabase = get_supabase_client()
-        
         transcription_data = {
             "id": transcription_id,
             "user_id": current_user["id"],
@@ -105,11 +122,11 @@ async def transcribe_audio_file(
             "duration_seconds": transcription_result.get("duration"),
             "chapters": transcription_result.get("chapters"),
             "word_count": transcription_result["word_count"],
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": now_iso
         }
         
-        supabase.table("audio_transcriptions").insert(transcription_data).execute()
-        logger.info(f"Transcription saved to database: {transcription_id}")
+        await run_db(supabase.table("audio_transcriptions").insert(transcription_data).execute)
+        logger.info("Transcription saved to database: {}", transcription_id)
         
         # Optionally save as note
         note_id = None
@@ -120,22 +137,22 @@ async def transcribe_audio_file(
                 "content": transcription_result["text"],
                 "subject": subject,
                 "tags": ["audio-transcription", topic.lower()],
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
+                "created_at": now_iso,
+                "updated_at": now_iso
             }
             
-            note_result = supabase.table("notes").insert(note_data).execute()
+            note_result = await run_db(supabase.table("notes").insert(note_data).execute)
             
             if note_result.data:
                 note_id = note_result.data[0].get("id")
-                logger.info(f"Transcription saved as note: {note_id}")
+                logger.info("Transcription saved as note: {}", note_id)
         
         # Clean up temp file
         try:
             os.remove(temp_file_path)
-            logger.debug(f"Temp file removed: {temp_file_path}")
+            logger.debug("Temp file removed: {}", temp_file_path)
         except Exception as e:
-            logger.warning(f"Failed to remove temp file: {str(e)}")
+            logger.warning("Failed to remove temp file: {}", str(e))
         
         return AudioTranscriptionResponse(
             transcription_id=transcription_id,
@@ -163,20 +180,21 @@ async def transcribe_audio_file(
 async def get_user_transcriptions(
     limit: int = 10,
     offset: int = 0,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
 ):
     """Get user's transcription history"""
     try:
-        supabase = get_supabase_client()
-        
-        result = supabase.table("audio_transcriptions")\
-            .select("*")\
-            .eq("user_id", current_user["id"])\
-            .order("created_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
+        result = await run_db(
+            supabase.table("audio_transcriptions")
+            .select("*")
+            .eq("user_id", current_user["id"])
+            .order("created_at", desc=True)
+            .range(offset, offset + limit - 1)
+            .execute
+        )
         
-        logger.info(f"Retrieved {len(result.data)} transcriptions for user {current_user['id']}")
+        logger.info("Retrieved {} transcriptions for user {}", len(result.data), current_user['id'])
         
         return {
             "transcriptions": result.data,
@@ -193,17 +211,18 @@ async def get_user_transcriptions(
 @router.get("/transcriptions/{transcription_id}")
 async def get_transcription_detail(
     transcription_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
 ):
     """Get details of a specific transcription"""
     try:
-        supabase = get_supabase_client()
-        
-        result = supabase.table("audio_transcriptions")\
-            .select("*")\
-            .eq("id", transcription_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
+        result = await run_db(
+            supabase.table("audio_transcriptions")
+            .select("*")
+            .eq("id", transcription_id)
+            .eq("user_id", current_user["id"])
+            .execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Transcription not found")
@@ -220,22 +239,23 @@ async def get_transcription_detail(
 @router.delete("/transcriptions/{transcription_id}")
 async def delete_transcription(
     transcription_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
 ):
     """Delete a transcription"""
     try:
-        supabase = get_supabase_client()
-        
-        result = supabase.table("audio_transcriptions")\
-            .delete()\
-            .eq("id", transcription_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
+        result = await run_db(
+            supabase.table("audio_transcriptions")
+            .delete()
+            .eq("id", transcription_id)
+            .eq("user_id", current_user["id"])
+            .execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Transcription not found")
         
-        logger.info(f"Deleted transcription: {transcription_id}")
+        logger.info("Deleted transcription: {}", transcription_id)
         
         return {
             "message": "Transcription deleted successfully",
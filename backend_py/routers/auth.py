@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
-from ..utils.supabase_client import get_supabase_client
+from supabase import Client
+from ..utils.supabase_client import run_db
 from ..utils.logger import log_success, log_error, log_api_call
-from ..dependencies.auth import get_current_user
+from ..dependencies.auth import get_current_user, get_supabase
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
@@ -40,15 +41,13 @@ class ProfileResponse(BaseModel):
 
 
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
-async def register(payload: RegisterRequest):
+async def register(payload: RegisterRequest, supabase: Client = Depends(get_supabase)):
     """
     Register a new user with Supabase Auth and create user profile
     """
     try:
         log_api_call("/api/auth/register", "POST", payload.email)
-        
-        supabase = get_supabase_client()
-        
+
         # Validate password length
         if len(payload.password) < 6:
             raise HTTPException(
@@ -57,7 +56,7 @@ async def register(payload: RegisterRequest):
             )
         
         # Create user with Supabase Auth
-        auth_response = supabase.auth.sign_up({
+        auth_response = await run_db(lambda: supabase.auth.sign_up({
             "email": payload.email,
             "password": payload.password,
             "options": {
@@ -65,7 +64,7 @@ async def register(payload: RegisterRequest):
                     "username": payload.username,
                 }
             }
-        })
+        }))
         
         if not auth_response.user:
             log_error(Exception("Registration failed"), "Auth.Register")
@@ -82,10 +81,10 @@ async def register(payload: RegisterRequest):
             token = auth_response.session.access_token
         else:
             # Sign in the user to get a session
-            session_response = supabase.auth.sign_in_with_password({
+            session_response = await run_db(lambda: supabase.auth.sign_in_with_password({
                 "email": payload.email,
                 "password": payload.password
-            })
+            }))
             if session_response.session:
                 token = session_response.session.access_token
             else:
@@ -108,7 +107,7 @@ async def register(payload: RegisterRequest):
                 "learning_style": payload.learningStyle,
             }
             
-            supabase.table("users").insert(profile_data).execute()
+            await run_db(supabase.table("users").insert(profile_data).execute)
             
         except Exception as e:
             log_error(e, "Auth.Register.Profile")
@@ -142,20 +141,18 @@ async def register(payload: RegisterRequest):
 
 
 @router.post("/login", response_model=AuthResponse)
-async def login(payload: LoginRequest):
+async def login(payload: LoginRequest, supabase: Client = Depends(get_supabase)):
     """
     Login user with Supabase Auth
     """
     try:
         log_api_call("/api/auth/login", "POST", payload.email)
-        
-        supabase = get_supabase_client()
-        
+
         # Sign in with Supabase
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_db(lambda: supabase.auth.sign_in_with_password({
             "email": payload.email,
             "password": payload.password
-        })
+        }))
         
         if not auth_response.user or not auth_response.session:
             log_error(Exception("Invalid credentials"), "Auth.Login")
@@ -169,8 +166,8 @@ async def login(payload: LoginRequest):
         
         # Get user profile from database
         try:
-            profile_response = supabase.table("users").select("*").eq("id", user_id).execute()
-            
+            profile_response = await run_db(supabase.table("users").select("*").eq("id", user_id).execute)
+
             if profile_response.data and len(profile_response.data) > 0:
                 profile = profile_response.data[0]
                 user_data = {
@@ -221,19 +218,18 @@ async def login(payload: LoginRequest):
 
 
 @router.get("/profile", response_model=ProfileResponse)
-async def get_profile(user=Depends(get_current_user)):
+async def get_profile(user=Depends(get_current_user), supabase: Client = Depends(get_supabase)):
     """
     Get current user's profile
     """
     try:
         log_api_call("/api/auth/profile", "GET", user.get("id", ""))
-        
-        supabase = get_supabase_client()
+
         user_id = user.get("id")
         
         # Get user profile from database
-        profile_response = supabase.table("users").select("*").eq("id", user_id).execute()
-        
+        profile_response = await run_db(supabase.table("users").select("*").eq("id", user_id).execute)
+
         if not profile_response.data or len(profile_response.data) == 0:
             # Return basic user data from auth
             user_data = {
@@ -268,14 +264,13 @@ async def get_profile(user=Depends(get_current_user)):
 
 
 @router.put("/profile", response_model=ProfileResponse)
-async def update_profile(payload: ProfileUpdateRequest, user=Depends(get_current_user)):
+async def update_profile(payload: ProfileUpdateRequest, user=Depends(get_current_user), supabase: Client = Depends(get_supabase)):
     """
     Update current user's profile
     """
     try:
         log_api_call("/api/auth/profile", "PUT", user.get("id", ""))
-        
-        supabase = get_supabase_client()
+
         user_id = user.get("id")
         
         # Build update data (only include provided fields)
@@ -296,10 +291,10 @@ async def update_profile(payload: ProfileUpdateRequest, user=Depends(get_current
             )
         
         # Update user profile in database
-        supabase.table("users").update(update_data).eq("id", user_id).execute()
-        
+        await run_db(supabase.table("users").update(update_data).eq("id", user_id).execute)
+
         # Get updated profile
-        profile_response = supabase.table("users").select("*").eq("id", user_id).execute()
+        profile_response = await run_db(supabase.table("users").select("*").eq("id", user_id).execute)
         
         if profile_response.data and len(profile_response.data) > 0:
             profile = profile_response.data[0]
@@ -332,18 +327,16 @@ async def update_profile(payload: ProfileUpdateRequest, user=Depends(get_current
 
 
 @router.post("/logout")
-async def logout(user=Depends(get_current_user)):
+async def logout(user=Depends(get_current_user), supabase: Client = Depends(get_supabase)):
     """
     Logout current user (mostly client-side, but can revoke token server-side)
     """
     try:
         log_api_call("/api/auth/logout", "POST", user.get("id", ""))
-        
-        supabase = get_supabase_client()
-        
+
         # Sign out from Supabase
         try:
-            supabase.auth.sign_out()
+            await run_db(supabase.auth.sign_out)
         except:
             pass  # Ignore errors as logout is mainly client-side
         
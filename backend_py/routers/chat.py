@@ -1,48 +1,48 @@
+import asyncio
+from uuid import uuid4
+
 from fastapi import APIRouter, Depends, HTTPException
-from ..dependencies.auth import get_current_user
+from supabase import Client
+from ..dependencies.auth import get_current_user, get_supabase
 from ..schemas import ChatMessageCreate, ChatResponse
 from ..services.gemini import generate_chat_reply
-from ..utils.supabase_client import get_supabase_client
+from ..utils.supabase_client import run_db
 
-router = APIRouter(prefix="/api/chat", tags=["chat"]) 
+router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 
 @router.post("/send", response_model=ChatResponse)
-def send_message(payload: ChatMessageCreate, user=Depends(get_current_user)):
+async def send_message(payload: ChatMessageCreate, user=Depends(get_current_user), supabase: Client = Depends(get_supabase)):
     if not payload.message.strip():
         raise HTTPException(status_code=400, detail="Message is required")
 
-    reply = generate_chat_reply(payload.message, payload.subject)
-
-    # Persist user message and AI reply
-    supabase = get_supabase_client()
-
-    # Create a session id if not provided
-    from uuid import uuid4
+    # Ids are generated here so the AI message_id is known without
+    # reading the insert result back.
     session_id = payload.session_id or str(uuid4())
+    message_id = str(uuid4())
 
-    # User message
-    supabase.table("chat_messages").insert({
+    user_row = {
+        "id": str(uuid4()),
         "user_id": user.get("id", "anonymous"),
         "role": "user",
         "content": payload.message,
         "session_id": session_id,
-    }).execute()
+    }
+
+    # The user message does not depend on the reply, so persist it while
+    # Gemini is generating instead of waiting for the LLM to finish.
+    reply, _ = await asyncio.gather(
+        asyncio.to_thread(generate_chat_reply, payload.message, payload.subject),
+        run_db(supabase.table("chat_messages").insert(user_row).execute),
+    )
 
-    # AI message
-    ai_insert = supabase.table("chat_messages").insert({
+    ai_row = {
+        "id": message_id,
         "user_id": user.get("id", "anonymous"),
         "role": "assistant",
         "content": reply,
         "session_id": session_id,
-    }).execute()
-
-    message_id = None
-    try:
-        data = getattr(ai_insert, "data", None)
-        if data and len(data) > 0:
-            message_id = data[0].get("id")
-    except Exception:
-        message_id = None
+    }
+    await run_db(supabase.table("chat_messages").insert(ai_row).execute)
 
     return ChatResponse(reply=reply, message_id=message_id, session_id=session_id)
@@ -3,8 +3,9 @@ Flashcard Router
 Handles flashcard generation from notes and spaced repetition
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from typing import List
+import asyncio
 import uuid
 from datetime import datetime
 
@@ -15,7 +16,8 @@ from ..schemas import (
 )
 from ..services.flashcard_service import FlashcardService
 from ..dependencies.auth import get_current_user
-from ..utils.supabase_client import get_supabase_client
+from ..services.points import award
+from ..utils.supabase_client import get_supabase_client, run_db
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -28,6 +30,7 @@ flashcard_service = FlashcardService()
 @router.post("/generate", response_model=FlashcardGenerateResponse)
 async def generate_flashcards_from_content(
     request: FlashcardGenerateRequest,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user)
 ):
     """
@@ -51,11 +54,11 @@ async def generate_flashcards_from_content(
         note_title = "Custom Content"
         
         if request.note_id:
-            note_result = supabase.table("notes")\
-                .select("*")\
-                .eq("id", request.note_id)\
-                .eq("user_id", current_user["id"])\
-                .execute()
+            note_result = await run_db(supabase.table("notes")
+                                       .select("*")
+                                       .eq("id", request.note_id)
+                                       .eq("user_id", current_user["id"])
+                                       .execute)
             
             if not note_result.data:
                 raise HTTPException(status_code=404, detail="Note not found")
@@ -85,13 +88,12 @@ async def generate_flashcards_from_content(
                 detail="Failed to generate flashcards from content"
             )
         
-        # Save flashcards to database
-        saved_flashcards = []
-        for card in flashcards:
-            flashcard_id = str(uuid.uuid4())
-            
-            flashcard_data = {
-                "id": flashcard_id,
+        # Save flashcards to database with a single bulk insert instead of
+        # one round-trip per card
+        now_iso = datetime.utcnow().isoformat()
+        flashcard_rows = [
+            {
+                "id": str(uuid.uuid4()),
                 "user_id": current_user["id"],
                 "question": card["question"],
                 "answer": card["answer"],
@@ -99,31 +101,25 @@ async def generate_flashcards_from_content(
                 "hint": card.get("hint"),
                 "source": source,
                 "note_id": request.note_id,
-                "next_review_date": datetime.utcnow().isoformat(),
+                "next_review_date": now_iso,
                 "review_count": 0,
                 "correct_count": 0,
-                "created_at": datetime.utcnow().isoformat()
+                "created_at": now_iso
             }
-            
-            result = supabase.table("flashcards").insert(flashcard_data).execute()
-            
-            if result.data:
-                saved_flashcards.append(card)
-        
-        logger.info(f"Generated and saved {len(saved_flashcards)} flashcards")
-        
-        # Award points for flashcard creation
-        points_data = {
-            "user_id": current_user["id"],
-            "points": len(saved_flashcards) * 5,  # 5 points per flashcard
-            "action_type": "flashcards_created",
-            "created_at": datetime.utcnow().isoformat()
-        }
-        supabase.table("user_points").insert(points_data).execute()
-        
+            for card in flashcards
+        ]
+
+        # The client only needs the generated cards; persist them and award
+        # points (5 per card) after the response has been flushed
+        background_tasks.add_task(
+            _persist_generated_flashcards, supabase, flashcard_rows, current_user["id"]
+        )
+
+        logger.info(f"Generated {len(flashcards)} flashcards; persisting in background")
+
         # Convert to response format
         flashcard_responses = [
-            GeneratedFlashcard(**card) for card in saved_flashcards
+            GeneratedFlashcard(**card) for card in flashcards
         ]
         
         return FlashcardGenerateResponse(
@@ -143,6 +139,18 @@ async def generate_flashcards_from_content(
         )
 
 
+async def _persist_generated_flashcards(supabase, flashcard_rows: List[dict], user_id: str):
+    """Persist generated flashcards and award points after the response"""
+    try:
+        await asyncio.gather(
+            run_db(supabase.table("flashcards").insert(flashcard_rows).execute),
+            award(user_id, len(flashcard_rows) * 5, "flashcards_created"),
+        )
+        logger.info(f"Persisted {len(flashcard_rows)} flashcards in background")
+    except Exception as e:
+        logger.error(f"Background flashcard persistence failed: {str(e)}", exc_info=True)
+
+
 @router.get("/all")
 async def get_all_flashcards(
     limit: int = 50,
@@ -154,22 +162,24 @@ async def get_all_flashcards(
     try:
         supabase = get_supabase_client()
         
+        # count="exact" makes PostgREST return the full match count in a
+        # header, so "total" is the real total rather than the page size
         query = supabase.table("flashcards")\
-            .select("*")\
+            .select("*", count="exact")\
             .eq("user_id", current_user["id"])
-        
+
         if difficulty:
             query = query.eq("difficulty", difficulty)
-        
-        result = query.order("created_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
-        
+
+        result = await run_db(query.order("created_at", desc=True)
+                              .range(offset, offset + limit - 1)
+                              .execute)
+
         logger.info(f"Retrieved {len(result.data)} flashcards for user")
-        
+
         return {
             "flashcards": result.data,
-            "total": len(result.data),
+            "total": result.count if result.count is not None else len(result.data),
             "limit": limit,
             "offset": offset
         }
@@ -190,13 +200,13 @@ async def get_due_flashcards(
         
         current_time = datetime.utcnow().isoformat()
         
-        result = supabase.table("flashcards")\
-            .select("*")\
-            .eq("user_id", current_user["id"])\
-            .lte("next_review_date", current_time)\
-            .order("next_review_date", desc=False)\
-            .limit(limit)\
-            .execute()
+        result = await run_db(supabase.table("flashcards")
+                              .select("*")
+                              .eq("user_id", current_user["id"])
+                              .lte("next_review_date", current_time)
+                              .order("next_review_date", desc=False)
+                              .limit(limit)
+                              .execute)
         
         logger.info(f"Retrieved {len(result.data)} due flashcards for user")
         
@@ -214,6 +224,7 @@ async def get_due_flashcards(
 async def review_flashcard(
     flashcard_id: str,
     performance: str,  # "again", "hard", "good", "easy"
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user)
 ):
     """
@@ -231,58 +242,36 @@ async def review_flashcard(
     try:
         supabase = get_supabase_client()
         
-        # Get current flashcard data
-        flashcard_result = supabase.table("flashcards")\
-            .select("*")\
-            .eq("id", flashcard_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
-        
-        if not flashcard_result.data:
+        now_iso = datetime.utcnow().isoformat()
+
+        # One atomic UPDATE ... RETURNING (see
+        # docs/database_migration_phase2.sql) computes the SM-2 interval
+        # transition from the stored per-card state and replaces the
+        # previous SELECT-then-UPDATE pair and its read-modify-write race
+        result = await run_db(supabase.rpc("review_flashcard", {
+            "p_flashcard_id": flashcard_id,
+            "p_user_id": current_user["id"],
+            "p_performance": performance,
+            "p_reviewed_at": now_iso
+        }).execute)
+
+        if not result.data:
             raise HTTPException(status_code=404, detail="Flashcard not found")
-        
-        flashcard = flashcard_result.data[0]
-        
-        # Calculate next review using spaced repetition
-        current_interval = 1  # You could store this in DB
-        review_schedule = flashcard_service.calculate_next_review(
-            performance=performance,
-            current_interval=current_interval
-        )
-        
-        # Update flashcard
-        is_correct = performance in ["good", "easy"]
-        
-        update_data = {
-            "next_review_date": review_schedule["next_review_date"],
-            "review_count": flashcard["review_count"] + 1,
-            "correct_count": flashcard["correct_count"] + (1 if is_correct else 0),
-            "last_reviewed": datetime.utcnow().isoformat()
-        }
-        
-        supabase.table("flashcards")\
-            .update(update_data)\
-            .eq("id", flashcard_id)\
-            .execute()
+
+        updated_card = result.data[0]
         
         logger.info(f"Flashcard {flashcard_id} reviewed with performance: {performance}")
         
-        # Award points for review
+        # Award points for review after the response has been flushed
         points = {"again": 1, "hard": 2, "good": 3, "easy": 5}[performance]
-        
-        points_data = {
-            "user_id": current_user["id"],
-            "points": points,
-            "action_type": "flashcard_reviewed",
-            "reference_id": flashcard_id,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        supabase.table("user_points").insert(points_data).execute()
-        
+        background_tasks.add_task(
+            award, current_user["id"], points, "flashcard_reviewed", flashcard_id
+        )
+
         return {
             "message": "Flashcard reviewed successfully",
             "flashcard_id": flashcard_id,
-            "next_review": review_schedule["next_review_date"],
+            "next_review": updated_card["next_review_date"],
             "points_earned": points,
             "status": "success"
         }
@@ -303,11 +292,11 @@ async def delete_flashcard(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("flashcards")\
-            .delete()\
-            .eq("id", flashcard_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
+        result = await run_db(supabase.table("flashcards")
+                              .delete()
+                              .eq("id", flashcard_id)
+                              .eq("user_id", current_user["id"])
+                              .execute)
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Flashcard not found")
@@ -333,36 +322,21 @@ async def get_flashcard_stats(
     """Get user's flashcard statistics"""
     try:
         supabase = get_supabase_client()
-        
-        # Get all flashcards
-        flashcards = supabase.table("flashcards")\
-            .select("*")\
-            .eq("user_id", current_user["id"])\
-            .execute()
-        
-        if not flashcards.data:
-            return {
-                "total_flashcards": 0,
-                "total_reviews": 0,
-                "average_accuracy": 0,
-                "due_today": 0
-            }
-        
-        total_flashcards = len(flashcards.data)
-        total_reviews = sum(f["review_count"] for f in flashcards.data)
-        total_correct = sum(f["correct_count"] for f in flashcards.data)
-        average_accuracy = (total_correct / total_reviews * 100) if total_reviews > 0 else 0
-        
-        # Count due flashcards
-        current_time = datetime.utcnow().isoformat()
-        due_today = sum(1 for f in flashcards.data if f["next_review_date"] <= current_time)
-        
+
+        # All aggregates are computed in one SQL scan
+        # (see docs/database_migration_phase2.sql) instead of pulling
+        # every flashcard row into Python
+        stats_result = await run_db(supabase.rpc(
+            "get_flashcard_aggregate_stats", {"p_user_id": current_user["id"]}
+        ).execute)
+        stats = stats_result.data or {}
+
         return {
-            "total_flashcards": total_flashcards,
-            "total_reviews": total_reviews,
-            "average_accuracy": round(average_accuracy, 2),
-            "due_today": due_today,
-            "mastered": sum(1 for f in flashcards.data if f["review_count"] >= 5 and (f["correct_count"] / max(f["review_count"], 1)) > 0.8)
+            "total_flashcards": stats.get("total_flashcards", 0),
+            "total_reviews": stats.get("total_reviews", 0),
+            "average_accuracy": round(stats.get("average_accuracy") or 0, 2),
+            "due_today": stats.get("due_today", 0),
+            "mastered": stats.get("mastered", 0)
         }
         
     except Exception as e:
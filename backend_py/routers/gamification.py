@@ -3,22 +3,42 @@ Gamification Router
 Handles user points, achievements, streaks, and leaderboard
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from datetime import datetime, timedelta
 from typing import List, Dict
+import asyncio
+import hashlib
 import math
 
+import orjson
+
 from ..schemas import UserStats, Achievement, LeaderboardEntry
 from ..dependencies.auth import get_current_user
-from ..utils.supabase_client import get_supabase_client
+from ..services.points import award, pending_points
+from ..utils.cache import cached
+from ..utils.supabase_client import get_supabase_client, run_db
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/gamification", tags=["gamification"])
 
 
+def _etag_for(payload) -> str:
+    """Strong ETag derived from the response payload
+
+    Content-derived (not hash()) so the tag is stable across workers and
+    restarts.
+    """
+    digest = hashlib.blake2b(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=8
+    ).hexdigest()
+    return f'"{digest}"'
+
+
 @router.get("/stats", response_model=UserStats)
 async def get_user_stats(
+    request: Request,
+    response: Response,
     current_user = Depends(get_current_user)
 ):
     """
@@ -31,67 +51,64 @@ async def get_user_stats(
         user_id = current_user["id"]
         
         logger.info(f"Fetching gamification stats for user {user_id}")
-        
-        # Calculate streak from study sessions
-        streak = await calculate_streak(user_id, supabase)
-        
-        # Get total points
-        points_result = supabase.table("user_points")\
-            .select("points")\
-            .eq("user_id", user_id)\
-            .execute()
-        
-        total_points = sum(p["points"] for p in points_result.data) if points_result.data else 0
-        
-        # Calculate level
-        level = calculate_level(total_points)
-        next_level_points = calculate_next_level_points(total_points)
-        
-        # Get achievements
-        achievements_result = supabase.table("user_achievements")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("unlocked_at", desc=True)\
-            .execute()
-        
-        achievements = achievements_result.data if achievements_result.data else []
-        
-        # Calculate daily goal progress (assumed 2 hours = 100%)
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        sessions_today = supabase.table("study_sessions")\
-            .select("duration_seconds")\
-            .eq("user_id", user_id)\
-            .gte("created_at", today_start.isoformat())\
-            .execute()
-        
-        total_seconds_today = sum(s.get("duration_seconds", 0) for s in sessions_today.data) if sessions_today.data else 0
-        daily_goal_progress = min((total_seconds_today / (2 * 3600)) * 100, 100)  # 2 hours = 100%
-        
-        # Calculate weekly study hours
-        week_start = datetime.utcnow() - timedelta(days=7)
-        
-        sessions_week = supabase.table("study_sessions")\
-            .select("duration_seconds")\
-            .eq("user_id", user_id)\
-            .gte("created_at", week_start.isoformat())\
-            .execute()
-        
-        total_seconds_week = sum(s.get("duration_seconds", 0) for s in sessions_week.data) if sessions_week.data else 0
-        weekly_study_hours = total_seconds_week / 3600
-        
-        logger.info(f"Stats calculated: Level {level}, {total_points} points, {streak} day streak")
-        
-        return UserStats(
-            streak=streak,
-            total_points=total_points,
-            level=level,
-            next_level_points=next_level_points,
-            achievements=achievements,
-            daily_goal_progress=round(daily_goal_progress, 2),
-            weekly_study_hours=round(weekly_study_hours, 2)
-        )
-        
+
+        async def compute_stats():
+            # All four reads are independent, so overlap them instead of
+            # paying one round-trip of latency each; the two session time
+            # windows come back from a single study_time_buckets scan
+            streak, points_result, achievements_result, buckets_result = await asyncio.gather(
+                calculate_streak(user_id, supabase),
+                run_db(supabase.rpc("get_user_points_total", {"p_user_id": user_id}).execute),
+                run_db(supabase.table("user_achievements")
+                       .select("*")
+                       .eq("user_id", user_id)
+                       .order("unlocked_at", desc=True)
+                       .execute),
+                run_db(supabase.rpc("study_time_buckets", {"p_user_id": user_id}).execute),
+            )
+
+            # Include points buffered in Redis but not yet flushed to the DB
+            total_points = int(points_result.data or 0) + await pending_points(user_id)
+
+            # Calculate level
+            level = calculate_level(total_points)
+            next_level_points = calculate_next_level_points(total_points)
+
+            achievements = achievements_result.data if achievements_result.data else []
+
+            buckets = buckets_result.data or {}
+
+            # Calculate daily goal progress (assumed 2 hours = 100%)
+            total_seconds_today = buckets.get("today_seconds") or 0
+            daily_goal_progress = min((total_seconds_today / (2 * 3600)) * 100, 100)  # 2 hours = 100%
+
+            # Calculate weekly study hours
+            total_seconds_week = buckets.get("week_seconds") or 0
+            weekly_study_hours = total_seconds_week / 3600
+
+            logger.info(f"Stats calculated: Level {level}, {total_points} points, {streak} day streak")
+
+            return {
+                "streak": streak,
+                "total_points": total_points,
+                "level": level,
+                "next_level_points": next_level_points,
+                "achievements": achievements,
+                "daily_goal_progress": round(daily_goal_progress, 2),
+                "weekly_study_hours": round(weekly_study_hours, 2)
+            }
+
+        stats = await cached(f"stats:{user_id}", ttl=60, compute=compute_stats)
+
+        # Polled by the UI: a matching ETag means nothing changed, so the
+        # client keeps its copy and no body is serialized or transferred
+        etag = _etag_for(stats)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304)
+        response.headers["ETag"] = etag
+
+        return UserStats(**stats)
+
     except Exception as e:
         logger.error(f"Error fetching user stats: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch statistics")
@@ -99,6 +116,8 @@ async def get_user_stats(
 
 @router.get("/leaderboard")
 async def get_leaderboard(
+    request: Request,
+    response: Response,
     limit: int = 50,
     period: str = "all_time"  # "all_time", "weekly", "monthly"
 ):
@@ -110,68 +129,57 @@ async def get_leaderboard(
     """
     try:
         supabase = get_supabase_client()
-        
-        # Determine time filter
-        time_filter = None
-        if period == "weekly":
-            time_filter = datetime.utcnow() - timedelta(days=7)
-        elif period == "monthly":
-            time_filter = datetime.utcnow() - timedelta(days=30)
-        
-        # Get points with user info
-        query = supabase.table("user_points").select("user_id, points, created_at")
-        
-        if time_filter:
-            query = query.gte("created_at", time_filter.isoformat())
-        
-        points_result = query.execute()
-        
-        # Aggregate points by user
-        user_points = {}
-        for p in points_result.data:
-            user_id = p["user_id"]
-            points = p["points"]
-            
-            if user_id not in user_points:
-                user_points[user_id] = 0
-            user_points[user_id] += points
-        
-        # Sort by points
-        sorted_users = sorted(user_points.items(), key=lambda x: x[1], reverse=True)[:limit]
-        
-        # Build leaderboard with user info
-        leaderboard = []
-        for rank, (user_id, points) in enumerate(sorted_users, 1):
-            # Get user info
-            user_result = supabase.table("users")\
-                .select("email")\
-                .eq("id", user_id)\
-                .execute()
-            
-            username = user_result.data[0]["email"].split("@")[0] if user_result.data else "Anonymous"
-            
-            # Calculate streak
-            streak = await calculate_streak(user_id, supabase)
-            
-            leaderboard.append(
-                LeaderboardEntry(
-                    rank=rank,
-                    user_id=user_id,
-                    username=username,
-                    points=points,
-                    level=calculate_level(points),
-                    streak=streak
+
+        async def compute_leaderboard():
+            # Determine time filter
+            time_filter = None
+            if period == "weekly":
+                time_filter = datetime.utcnow() - timedelta(days=7)
+            elif period == "monthly":
+                time_filter = datetime.utcnow() - timedelta(days=30)
+
+            # One RPC returns aggregated points, email and streak for the
+            # top users (see docs/database_migration_phase2.sql), replacing
+            # a users lookup and a streak scan per rank
+            rows_result = await run_db(supabase.rpc("get_leaderboard", {
+                "p_since": time_filter.isoformat() if time_filter else None,
+                "p_limit": limit
+            }).execute)
+            rows = rows_result.data or []
+
+            leaderboard = []
+            for rank, row in enumerate(rows, 1):
+                email = row.get("email") or ""
+                username = email.split("@")[0] if email else "Anonymous"
+
+                leaderboard.append(
+                    LeaderboardEntry(
+                        rank=rank,
+                        user_id=row["user_id"],
+                        username=username,
+                        points=row["points"],
+                        level=calculate_level(row["points"]),
+                        streak=row.get("streak") or 0
+                    ).model_dump()
                 )
-            )
-        
-        logger.info(f"Generated leaderboard with {len(leaderboard)} entries for period: {period}")
-        
-        return {
-            "leaderboard": leaderboard,
-            "period": period,
-            "total_users": len(leaderboard)
-        }
-        
+
+            logger.info(f"Generated leaderboard with {len(leaderboard)} entries for period: {period}")
+
+            return {
+                "leaderboard": leaderboard,
+                "period": period,
+                "total_users": len(leaderboard)
+            }
+
+        board = await cached(f"lb:{period}:{limit}", ttl=300, compute=compute_leaderboard)
+
+        etag = _etag_for(board)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304)
+        response.headers["ETag"] = etag
+
+        return board
+
     except Exception as e:
         logger.error(f"Error generating leaderboard: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to generate leaderboard")
@@ -191,18 +199,23 @@ async def check_and_unlock_achievements(
         user_id = current_user["id"]
         
         logger.info(f"Checking achievements for user {user_id}")
-        
+
         newly_unlocked = []
-        
-        # Get existing achievements
-        existing = supabase.table("user_achievements")\
-            .select("achievement_type")\
-            .eq("user_id", user_id)\
-            .execute()
-        
+
+        # Existing achievements and the aggregated counters RPC
+        # (see docs/database_migration_phase2.sql) are independent reads
+        existing, counters_result = await asyncio.gather(
+            run_db(supabase.table("user_achievements")
+                   .select("achievement_type")
+                   .eq("user_id", user_id)
+                   .execute),
+            run_db(supabase.rpc("get_achievement_counters", {"p_user_id": user_id}).execute),
+        )
+
         existing_types = set(a["achievement_type"] for a in existing.data) if existing.data else set()
-        
-        # Define achievement checks
+        counters = counters_result.data or {}
+
+        # Define achievement checks against the aggregated counters
         achievements_to_check = [
             {
                 "type": "first_note",
@@ -210,7 +223,8 @@ async def check_and_unlock_achievements(
                 "description": "Created your first note",
                 "icon_url": "📝",
                 "rarity": "common",
-                "check": lambda: check_notes_count(user_id, supabase, 1)
+                "counter": "notes_count",
+                "threshold": 1
             },
             {
                 "type": "note_master",
@@ -218,7 +232,8 @@ async def check_and_unlock_achievements(
                 "description": "Created 50 notes",
                 "icon_url": "📚",
                 "rarity": "rare",
-                "check": lambda: check_notes_count(user_id, supabase, 50)
+                "counter": "notes_count",
+                "threshold": 50
             },
             {
                 "type": "week_streak",
@@ -226,7 +241,8 @@ async def check_and_unlock_achievements(
                 "description": "Maintained a 7-day study streak",
                 "icon_url": "🔥",
                 "rarity": "uncommon",
-                "check": lambda: check_streak(user_id, supabase, 7)
+                "counter": "streak",
+                "threshold": 7
             },
             {
                 "type": "month_streak",
@@ -234,7 +250,8 @@ async def check_and_unlock_achievements(
                 "description": "Maintained a 30-day study streak",
                 "icon_url": "💪",
                 "rarity": "epic",
-                "check": lambda: check_streak(user_id, supabase, 30)
+                "counter": "streak",
+                "threshold": 30
             },
             {
                 "type": "pyq_master",
@@ -242,7 +259,8 @@ async def check_and_unlock_achievements(
                 "description": "Completed 20 practice questions",
                 "icon_url": "🎯",
                 "rarity": "rare",
-                "check": lambda: check_pyq_count(user_id, supabase, 20)
+                "counter": "pyq_count",
+                "threshold": 20
             },
             {
                 "type": "flashcard_creator",
@@ -250,43 +268,46 @@ async def check_and_unlock_achievements(
                 "description": "Generated 100 flashcards",
                 "icon_url": "🎴",
                 "rarity": "rare",
-                "check": lambda: check_flashcard_count(user_id, supabase, 100)
+                "counter": "flashcards_count",
+                "threshold": 100
             }
         ]
-        
-        # Check each achievement
+
+        # Collect everything to unlock, then write in two bulk inserts
+        points = {"common": 10, "uncommon": 25, "rare": 50, "epic": 100, "legendary": 200}
+        now_iso = datetime.utcnow().isoformat()
+        achievement_rows = []
+        points_rows = []
+
         for achievement in achievements_to_check:
-            if achievement["type"] not in existing_types:
-                if await achievement["check"]():
-                    # Unlock achievement
-                    achievement_data = {
-                        "user_id": user_id,
-                        "achievement_type": achievement["type"],
-                        "title": achievement["title"],
-                        "description": achievement["description"],
-                        "icon_url": achievement["icon_url"],
-                        "rarity": achievement["rarity"],
-                        "unlocked_at": datetime.utcnow().isoformat()
-                    }
-                    
-                    result = supabase.table("user_achievements").insert(achievement_data).execute()
-                    
-                    if result.data:
-                        newly_unlocked.append(achievement)
-                        logger.info(f"Unlocked achievement: {achievement['title']}")
-                        
-                        # Award points
-                        points = {"common": 10, "uncommon": 25, "rare": 50, "epic": 100, "legendary": 200}
-                        
-                        points_data = {
-                            "user_id": user_id,
-                            "points": points.get(achievement["rarity"], 10),
-                            "action_type": "achievement_unlocked",
-                            "created_at": datetime.utcnow().isoformat()
-                        }
-                        
-                        supabase.table("user_points").insert(points_data).execute()
-        
+            if achievement["type"] in existing_types:
+                continue
+            if (counters.get(achievement["counter"]) or 0) < achievement["threshold"]:
+                continue
+
+            achievement_rows.append({
+                "user_id": user_id,
+                "achievement_type": achievement["type"],
+                "title": achievement["title"],
+                "description": achievement["description"],
+                "icon_url": achievement["icon_url"],
+                "rarity": achievement["rarity"],
+                "unlocked_at": now_iso
+            })
+            points_rows.append({
+                "user_id": user_id,
+                "points": points.get(achievement["rarity"], 10),
+                "action_type": "achievement_unlocked",
+                "created_at": now_iso
+            })
+            newly_unlocked.append(achievement)
+            logger.info(f"Unlocked achievement: {achievement['title']}")
+
+        if achievement_rows:
+            await run_db(supabase.table("user_achievements").insert(achievement_rows).execute)
+            for row in points_rows:
+                await award(user_id, row["points"], row["action_type"])
+
         return {
             "newly_unlocked": newly_unlocked,
             "total_new": len(newly_unlocked),
@@ -303,37 +324,12 @@ async def check_and_unlock_achievements(
 async def calculate_streak(user_id: str, supabase) -> int:
     """Calculate user's current study streak"""
     try:
-        sessions = supabase.table("study_sessions")\
-            .select("created_at")\
-            .eq("user_id", user_id)\
-            .order("created_at", desc=True)\
-            .limit(100)\
-            .execute()
-        
-        if not sessions.data:
-            return 0
-        
-        streak = 1
-        last_date = datetime.fromisoformat(sessions.data[0]["created_at"].replace('Z', '+00:00')).date()
-        current_date = datetime.utcnow().date()
-        
-        # Check if user studied today or yesterday
-        if (current_date - last_date).days > 1:
-            return 0
-        
-        for session in sessions.data[1:]:
-            session_date = datetime.fromisoformat(session["created_at"].replace('Z', '+00:00')).date()
-            
-            if (last_date - session_date).days == 1:
-                streak += 1
-                last_date = session_date
-            elif (last_date - session_date).days == 0:
-                continue  # Same day
-            else:
-                break
-        
-        return streak
-        
+        # One window query returns the streak as a single integer
+        # (see docs/database_migration_phase2.sql) instead of 100 session
+        # rows parsed and walked in Python
+        result = await run_db(supabase.rpc("get_streak", {"p_user_id": user_id}).execute)
+        return int(result.data or 0)
+
     except Exception as e:
         logger.error(f"Error calculating streak: {str(e)}")
         return 0
@@ -342,35 +338,12 @@ async def calculate_streak(user_id: str, supabase) -> int:
 def calculate_level(points: int) -> int:
     """Calculate user level from points"""
     # Level formula: Level = floor(sqrt(points / 100)) + 1
-    return int(math.sqrt(points / 100)) + 1
+    # isqrt keeps the math in integers, avoiding FP rounding at level
+    # boundaries (this runs once per leaderboard entry)
+    return math.isqrt(max(points, 0) // 100) + 1
 
 
 def calculate_next_level_points(points: int) -> int:
     """Calculate points needed for next level"""
     current_level = calculate_level(points)
-    next_level_total = (current_level ** 2) * 100
-    return next_level_total - points
-
-
-async def check_notes_count(user_id: str, supabase, threshold: int) -> bool:
-    """Check if user has created enough notes"""
-    result = supabase.table("notes").select("id", count="exact").eq("user_id", user_id).execute()
-    return result.count >= threshold if hasattr(result, 'count') else len(result.data) >= threshold
-
-
-async def check_streak(user_id: str, supabase, days: int) -> bool:
-    """Check if user has maintained streak"""
-    current_streak = await calculate_streak(user_id, supabase)
-    return current_streak >= days
-
-
-async def check_pyq_count(user_id: str, supabase, threshold: int) -> bool:
-    """Check if user has completed enough PYQs"""
-    result = supabase.table("pyq_submissions").select("id", count="exact").eq("user_id", user_id).execute()
-    return result.count >= threshold if hasattr(result, 'count') else len(result.data) >= threshold
-
-
-async def check_flashcard_count(user_id: str, supabase, threshold: int) -> bool:
-    """Check if user has created enough flashcards"""
-    result = supabase.table("flashcards").select("id", count="exact").eq("user_id", user_id).execute()
-    return result.count >= threshold if hasattr(result, 'count') else len(result.data) >= threshold
+    return current_level * current_level * 100 - points
@@ -3,13 +3,13 @@ Notes Router
 Handles note creation, retrieval, update, and deletion
 """
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any, Optional
+from typing import List, Optional
 from datetime import datetime
-from uuid import uuid4
 from pydantic import BaseModel
 from ..dependencies.auth import get_current_user
+from ..utils.cache import cached
 from ..utils.logger import log_api_call, log_error, log_success
-from ..utils.supabase_client import get_supabase_client
+from ..utils.supabase_client import get_supabase_client, run_db
 
 router = APIRouter(prefix="/api/notes", tags=["notes"])
 
@@ -28,7 +28,7 @@ class NoteUpdate(BaseModel):
     tags: Optional[List[str]] = None
 
 
-@router.post("", response_model=Dict[str, Any])
+@router.post("")
 async def create_note(
     note: NoteCreate,
     user=Depends(get_current_user)
@@ -36,71 +36,143 @@ async def create_note(
     """Create a new note"""
     
     try:
-        log_api_call("/api/notes", "POST", user["id"], **note.dict())
+        # Log sizes and metadata only; a large note body would otherwise be
+        # serialized into every log record
+        log_api_call(
+            "/api/notes", "POST", user["id"],
+            title_len=len(note.title),
+            content_len=len(note.content),
+            subject=note.subject,
+            tag_count=len(note.tags or []),
+        )
         
-        note_id = str(uuid4())
         supabase = get_supabase_client()
-        
+
+        now = datetime.utcnow().isoformat()
         note_data = {
-            "id": note_id,
             "user_id": user["id"],
             "title": note.title,
             "content": note.content,
             "subject": note.subject,
             "tags": note.tags or [],
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "created_at": now,
+            "updated_at": now
         }
-        
-        result = supabase.table("notes").insert(note_data).execute()
-        
-        log_success(f"Created note: {note_id}", "NotesRouter")
-        
-        return result.data[0] if result.data else note_data
+
+        # The id comes back from the gen_random_uuid() column default
+        result = await run_db(supabase.table("notes").insert(note_data).execute)
+        created = result.data[0]
+
+        log_success(f"Created note: {created['id']}", "NotesRouter")
+
+        return created
         
     except Exception as e:
         log_error(e, "NotesRouter.create_note")
         raise HTTPException(status_code=500, detail=f"Failed to create note: {str(e)}")
 
 
-@router.get("", response_model=List[Dict[str, Any]])
+@router.get("")
 async def get_user_notes(
     subject: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
     user=Depends(get_current_user)
 ):
-    """Get all notes for the current user, optionally filtered by subject"""
-    
+    """Get notes for the current user, optionally filtered by subject
+
+    Keyset-paginated: pass the returned next_cursor to fetch the next
+    page. Bounds the response size instead of returning every note.
+    """
+
     try:
         supabase = get_supabase_client()
-        
-        query = supabase.table("notes").select("*").eq("user_id", user["id"])
-        
+
+        query = supabase.table("notes").select("*").eq(
+            "user_id", user["id"]
+        ).is_("deleted_at", "null")
+
         if subject and subject != "All":
             query = query.eq("subject", subject)
-        
-        result = query.order("created_at", desc=True).execute()
-        
+
+        if cursor:
+            query = query.lt("created_at", cursor)
+
+        result = await run_db(query.order("created_at", desc=True).limit(limit).execute)
+
         notes = result.data or []
-        
+        next_cursor = notes[-1]["created_at"] if len(notes) == limit else None
+
         log_success(f"Retrieved {len(notes)} notes", "NotesRouter")
-        
-        return notes
-        
+
+        return {"notes": notes, "next_cursor": next_cursor}
+
     except Exception as e:
         log_error(e, "NotesRouter.get_user_notes")
         raise HTTPException(status_code=500, detail="Failed to get notes")
 
 
-@router.get("/{note_id}", response_model=Dict[str, Any])
+@router.get("/search")
+async def search_notes(q: str, user=Depends(get_current_user)):
+    """Search notes by title or content
+
+    The query lives in the ``q`` parameter rather than the path, so it
+    needs no path-segment escaping and repeated searches share one cache
+    entry per (user, query).
+    """
+
+    # A one-character or whitespace query matches nearly every note; bail
+    # out before touching the database or the cache
+    q = q.strip().lower()
+    if len(q) < 2:
+        return []
+
+    try:
+        supabase = get_supabase_client()
+
+        async def run_search():
+            # Filter in Postgres, served by the trigram indexes in
+            # docs/database_migration_phase2.sql, instead of shipping the
+            # user's whole note corpus over the network to filter in
+            # Python. Commas and parentheses are PostgREST filter syntax,
+            # so neutralize them in the pattern.
+            pattern = "%{}%".format(
+                q.replace(",", " ").replace("(", " ").replace(")", " ")
+            )
+            result = await run_db(supabase.table("notes").select("*").eq(
+                "user_id", user["id"]
+            ).is_("deleted_at", "null").or_(
+                f"title.ilike.{pattern},content.ilike.{pattern}"
+            ).execute)
+            return result.data or []
+
+        # Users retype the same query while narrowing results; a short TTL
+        # absorbs those bursts without serving stale notes for long
+        filtered_notes = await cached(
+            f"notes:search:{user['id']}:{q}",
+            ttl=30,
+            compute=run_search,
+        )
+
+        log_success(f"Found {len(filtered_notes)} notes matching query", "NotesRouter")
+
+        return filtered_notes
+        
+    except Exception as e:
+        log_error(e, "NotesRouter.search_notes")
+        raise HTTPException(status_code=500, detail="Failed to search notes")
+
+
+@router.get("/{note_id}")
 async def get_note(note_id: str, user=Depends(get_current_user)):
     """Get a specific note"""
     
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("notes").select("*").eq(
+        result = await run_db(supabase.table("notes").select("*").eq(
             "id", note_id
-        ).eq("user_id", user["id"]).single().execute()
+        ).eq("user_id", user["id"]).is_("deleted_at", "null").single().execute)
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Note not found")
@@ -114,7 +186,7 @@ async def get_note(note_id: str, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="Failed to get note")
 
 
-@router.put("/{note_id}", response_model=Dict[str, Any])
+@router.put("/{note_id}")
 async def update_note(
     note_id: str,
     note_update: NoteUpdate,
@@ -124,27 +196,26 @@ async def update_note(
     
     try:
         supabase = get_supabase_client()
-        
-        # Check if note exists
-        existing = supabase.table("notes").select("*").eq(
-            "id", note_id
-        ).eq("user_id", user["id"]).single().execute()
-        
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Note not found")
-        
+
         # Prepare update data
-        update_data = {k: v for k, v in note_update.dict().items() if v is not None}
+        update_data = note_update.model_dump(exclude_none=True)
         update_data["updated_at"] = datetime.utcnow().isoformat()
-        
-        result = supabase.table("notes").update(update_data).eq(
+
+        # One UPDATE filtered on both id and user_id enforces ownership
+        # and returns the new row, replacing the SELECT-then-UPDATE pair
+        result = await run_db(supabase.table("notes").update(update_data).eq(
             "id", note_id
-        ).execute()
-        
+        ).eq("user_id", user["id"]).is_("deleted_at", "null").execute)
+
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Note not found")
+
         log_success(f"Updated note: {note_id}", "NotesRouter")
-        
-        return result.data[0] if result.data else {**existing.data, **update_data}
-        
+
+        return result.data[0]
+
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(e, "NotesRouter.update_note")
         raise HTTPException(status_code=500, detail="Failed to update note")
@@ -152,49 +223,49 @@ async def update_note(
 
 @router.delete("/{note_id}")
 async def delete_note(note_id: str, user=Depends(get_current_user)):
-    """Delete a note"""
-    
+    """Delete a note (soft delete; purged out of band)"""
+
     try:
         supabase = get_supabase_client()
-        
-        supabase.table("notes").delete().eq(
-            "id", note_id
-        ).eq("user_id", user["id"]).execute()
-        
+
+        # Soft delete: a one-column UPDATE instead of a DELETE, so the
+        # row can be purged in batches later (see the phase-2 migration)
+        await run_db(supabase.table("notes").update(
+            {"deleted_at": datetime.utcnow().isoformat()}
+        ).eq("id", note_id).eq("user_id", user["id"]).execute)
+
         log_success(f"Deleted note: {note_id}", "NotesRouter")
-        
+
         return {"message": "Note deleted successfully"}
-        
+
     except Exception as e:
         log_error(e, "NotesRouter.delete_note")
         raise HTTPException(status_code=500, detail="Failed to delete note")
 
 
-@router.get("/search/{query}", response_model=List[Dict[str, Any]])
-async def search_notes(query: str, user=Depends(get_current_user)):
-    """Search notes by title or content"""
-    
+class NotesBulkDelete(BaseModel):
+    ids: List[str]
+
+
+@router.post("/bulk_delete")
+async def bulk_delete_notes(payload: NotesBulkDelete, user=Depends(get_current_user)):
+    """Soft-delete several notes in one statement"""
+
+    if not payload.ids:
+        return {"deleted": 0}
+
     try:
         supabase = get_supabase_client()
-        
-        # Get all user notes and filter in Python (Supabase free tier limitation)
-        result = supabase.table("notes").select("*").eq(
-            "user_id", user["id"]
-        ).execute()
-        
-        notes = result.data or []
-        query_lower = query.lower()
-        
-        # Filter notes by query
-        filtered_notes = [
-            note for note in notes
-            if query_lower in note["title"].lower() or query_lower in note["content"].lower()
-        ]
-        
-        log_success(f"Found {len(filtered_notes)} notes matching query", "NotesRouter")
-        
-        return filtered_notes
-        
+
+        result = await run_db(supabase.table("notes").update(
+            {"deleted_at": datetime.utcnow().isoformat()}
+        ).eq("user_id", user["id"]).in_("id", payload.ids).execute)
+
+        deleted = len(result.data or [])
+        log_success(f"Deleted {deleted} notes in bulk", "NotesRouter")
+
+        return {"deleted": deleted}
+
     except Exception as e:
-        log_error(e, "NotesRouter.search_notes")
-        raise HTTPException(status_code=500, detail="Failed to search notes")
+        log_error(e, "NotesRouter.bulk_delete_notes")
+        raise HTTPException(status_code=500, detail="Failed to delete notes")
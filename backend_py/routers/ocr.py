@@ -5,13 +5,14 @@ Handles OCR text extraction (processed on frontend, saves to backend)
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import uuid
 from datetime import datetime
 
 from ..schemas import OCRRequest, OCRResponse
 from ..dependencies.auth import get_current_user
-from ..utils.supabase_client import get_supabase_client
+from ..utils.supabase_client import get_supabase_client, run_db
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -28,7 +29,12 @@ class OCRSaveRequest(BaseModel):
     confidence: Optional[float] = None
 
 
-@router.post("/save", response_model=OCRResponse)
+class BatchOCRSaveRequest(BaseModel):
+    """Request model for saving several OCR extractions in one call"""
+    items: List[OCRSaveRequest]
+
+
+@router.post("/save", response_model=OCRResponse, response_model_exclude_unset=True)
 async def save_ocr_text(
     request: OCRSaveRequest,
     current_user = Depends(get_current_user)
@@ -46,59 +52,43 @@ async def save_ocr_text(
     - **auto_save_as_note**: Save as a note automatically
     - **confidence**: OCR confidence score (0-1)
     """
+    # Reject empty payloads before logging or any Supabase work
+    text = request.extracted_text
+    if not text or not text.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Extracted text cannot be empty"
+        )
+
     logger.info(f"Saving OCR text from user {current_user['id']}")
-    
+
     try:
-        if not request.extracted_text or len(request.extracted_text.strip()) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Extracted text cannot be empty"
-            )
-        
         supabase = get_supabase_client()
-        
-        # Generate OCR ID
-        ocr_id = str(uuid.uuid4())
-        word_count = len(request.extracted_text.split())
-        
-        # Save OCR record
-        ocr_data = {
-            "id": ocr_id,
-            "user_id": current_user["id"],
-            "extracted_text": request.extracted_text,
-            "image_url": request.image_url,
-            "subject": request.subject,
-            "topic": request.topic,
-            "confidence": request.confidence,
-            "word_count": word_count,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        supabase.table("ocr_extractions").insert(ocr_data).execute()
-        logger.info(f"OCR text saved to database: {ocr_id}")
-        
-        # Optionally save as note
-        note_id = None
-        if request.auto_save_as_note:
-            note_data = {
-                "user_id": current_user["id"],
-                "title": f"📄 {request.topic} - OCR Extraction",
-                "content": request.extracted_text,
-                "subject": request.subject,
-                "tags": ["ocr-extraction", request.topic.lower()],
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            
-            note_result = supabase.table("notes").insert(note_data).execute()
-            
-            if note_result.data:
-                note_id = note_result.data[0].get("id")
-                logger.info(f"OCR text saved as note: {note_id}")
+
+        # Both inserts run in one transaction and one network call
+        # (see docs/database_migration_phase2.sql); the word count is
+        # computed server-side
+        result = await run_db(supabase.rpc("save_ocr_and_note", {
+            "p_user_id": current_user["id"],
+            "p_text": text,
+            "p_image_url": request.image_url,
+            "p_subject": request.subject,
+            "p_topic": request.topic,
+            "p_confidence": request.confidence,
+            "p_note_title": f"📄 {request.topic} - OCR Extraction",
+            "p_note_tags": ["ocr-extraction", request.topic.lower()],
+            "p_auto_note": request.auto_save_as_note,
+        }).execute)
+
+        saved = result.data[0]
+        ocr_id = saved["ocr_id"]
+        note_id = saved.get("note_id")
+        word_count = saved["word_count"]
+        logger.info(f"OCR text saved to database: {ocr_id} (note: {note_id})")
         
         return OCRResponse(
             ocr_id=ocr_id,
-            extracted_text=request.extracted_text,
+            extracted_text=text,
             confidence=request.confidence,
             word_count=word_count,
             note_id=note_id,
@@ -116,6 +106,95 @@ async def save_ocr_text(
         )
 
 
+@router.post("/save_batch", response_model=List[OCRResponse], response_model_exclude_unset=True)
+async def save_ocr_batch(
+    request: BatchOCRSaveRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    Save several OCR extractions in one call
+
+    Multi-page documents previously required one /ocr/save round-trip per
+    page; this endpoint writes all extractions (and their auto-saved
+    notes) with two bulk inserts.
+    """
+    logger.info("Saving batch of {} OCR extractions from user {}", len(request.items), current_user["id"])
+
+    try:
+        if not request.items:
+            raise HTTPException(status_code=400, detail="Batch cannot be empty")
+        if any(not item.extracted_text or not item.extracted_text.strip() for item in request.items):
+            raise HTTPException(status_code=400, detail="Extracted text cannot be empty")
+
+        supabase = get_supabase_client()
+        now_iso = datetime.utcnow().isoformat()
+
+        # Ids are pre-generated so responses can be built without reading
+        # the insert results back
+        ocr_rows = []
+        note_rows = []
+        responses = []
+        for item in request.items:
+            ocr_id = str(uuid.uuid4())
+            # The stored column is generated by Postgres (section 16 of the
+            # migration); split() here only to echo a figure in the
+            # response, matching the server-side any-whitespace definition
+            word_count = len(item.extracted_text.split())
+
+            ocr_rows.append({
+                "id": ocr_id,
+                "user_id": current_user["id"],
+                "extracted_text": item.extracted_text,
+                "image_url": item.image_url,
+                "subject": item.subject,
+                "topic": item.topic,
+                "confidence": item.confidence,
+                "created_at": now_iso
+            })
+
+            note_id = None
+            if item.auto_save_as_note:
+                note_id = str(uuid.uuid4())
+                note_rows.append({
+                    "id": note_id,
+                    "user_id": current_user["id"],
+                    "title": f"📄 {item.topic} - OCR Extraction",
+                    "content": item.extracted_text,
+                    "subject": item.subject,
+                    "tags": ["ocr-extraction", item.topic.lower()],
+                    "created_at": now_iso,
+                    "updated_at": now_iso
+                })
+
+            responses.append(OCRResponse(
+                ocr_id=ocr_id,
+                extracted_text=item.extracted_text,
+                confidence=item.confidence,
+                word_count=word_count,
+                note_id=note_id,
+                status="success",
+                message=f"OCR text saved successfully. {word_count} words extracted."
+            ))
+
+        inserts = [run_db(supabase.table("ocr_extractions").insert(ocr_rows).execute)]
+        if note_rows:
+            inserts.append(run_db(supabase.table("notes").insert(note_rows).execute))
+        await asyncio.gather(*inserts)
+
+        logger.info("Saved {} OCR extractions and {} notes in bulk", len(ocr_rows), len(note_rows))
+
+        return responses
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error saving OCR batch: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to save OCR batch: {str(e)}"
+        )
+
+
 @router.get("/extractions")
 async def get_user_ocr_extractions(
     limit: int = 10,
@@ -126,12 +205,15 @@ async def get_user_ocr_extractions(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("ocr_extractions")\
-            .select("*")\
-            .eq("user_id", current_user["id"])\
-            .order("created_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
+        result = await run_db(
+            supabase.table("ocr_extractions")
+            .select("*")
+            .eq("user_id", current_user["id"])
+            .is_("deleted_at", "null")
+            .order("created_at", desc=True)
+            .range(offset, offset + limit - 1)
+            .execute
+        )
         
         logger.info(f"Retrieved {len(result.data)} OCR extractions for user {current_user['id']}")
         
@@ -156,11 +238,14 @@ async def get_ocr_extraction_detail(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("ocr_extractions")\
-            .select("*")\
-            .eq("id", ocr_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
+        result = await run_db(
+            supabase.table("ocr_extractions")
+            .select("*")
+            .eq("id", ocr_id)
+            .eq("user_id", current_user["id"])
+            .is_("deleted_at", "null")
+            .execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=404, detail="OCR extraction not found")
@@ -183,11 +268,16 @@ async def delete_ocr_extraction(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("ocr_extractions")\
-            .delete()\
-            .eq("id", ocr_id)\
-            .eq("user_id", current_user["id"])\
-            .execute()
+        # Soft delete: a one-column UPDATE instead of a DELETE; rows are
+        # purged out of band (see the phase-2 migration)
+        result = await run_db(
+            supabase.table("ocr_extractions")
+            .update({"deleted_at": datetime.utcnow().isoformat()})
+            .eq("id", ocr_id)
+            .eq("user_id", current_user["id"])
+            .is_("deleted_at", "null")
+            .execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=404, detail="OCR extraction not found")
@@ -8,6 +8,8 @@ import asyncio
 
 router = APIRouter(prefix="/api/pdf", tags=["pdf"])
 
+MAX_PDF_BYTES = 10 * 1024 * 1024  # 10MB
+
 @router.post("/upload", response_model=PDFUploadResponse)
 async def upload_pdf(
     file: UploadFile = File(...),
@@ -20,16 +22,20 @@ async def upload_pdf(
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
-        # Validate file size (10MB limit)
-        file_content = await file.read()
-        if len(file_content) > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=400, detail="File size too large. Maximum 10MB allowed.")
-        
+        # Validate file size (10MB limit) in 1 MiB chunks so the upload is
+        # never buffered whole in memory and oversized transfers abort as
+        # soon as the counter crosses the cap
+        size = 0
+        while chunk := await file.read(1024 * 1024):
+            size += len(chunk)
+            if size > MAX_PDF_BYTES:
+                raise HTTPException(status_code=400, detail="File size too large. Maximum 10MB allowed.")
+
         # Reset file pointer
         await file.seek(0)
-        
+
         log_api_call("/api/pdf/upload", "POST", user["id"], filename=file.filename)
-        log_file_operation("upload", file.filename, user_id=user["id"], size=len(file_content))
+        log_file_operation("upload", file.filename, user_id=user["id"], size=size)
         
         # Process the PDF
         pdf_service = get_pdf_service()
@@ -3,19 +3,27 @@ Study Planner Router
 Handles AI-generated personalized study plans
 """
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
-from uuid import uuid4
+from typing import Optional
+from datetime import datetime
+import hashlib
+import re
+
+import orjson
+
 from ..dependencies.auth import get_current_user
 from ..schemas import StudyPlanRequest, StudyPlanResponse
 from ..services.gemini import get_gemini_service
+from ..utils.cache import cached
 from ..utils.logger import log_api_call, log_error, log_success
-from ..utils.supabase_client import get_supabase_client
+from ..utils.supabase_client import get_supabase_client, run_db
 
 router = APIRouter(prefix="/api/planner", tags=["planner"])
 
+# Strips a leading/trailing markdown code fence in one pass
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```\s*$")
 
-@router.post("/generate", response_model=StudyPlanResponse)
+
+@router.post("/generate", response_model=StudyPlanResponse, response_model_exclude_unset=True)
 async def generate_study_plan(
     request: StudyPlanRequest,
     user=Depends(get_current_user)
@@ -23,12 +31,26 @@ async def generate_study_plan(
     """Generate a personalized study plan using AI"""
     
     try:
-        log_api_call("/api/planner/generate", "POST", user["id"], **request.dict())
-        
-        # Generate plan using AI
-        gemini_service = get_gemini_service()
-        
-        prompt = f"""
+        log_api_call(
+            "/api/planner/generate", "POST", user["id"],
+            subject_count=len(request.subjects),
+            study_hours_per_week=request.study_hours_per_week,
+            difficulty_level=request.difficulty_level,
+            focus_area_count=len(request.focus_areas or []),
+        )
+
+        # Identical inputs produce an equivalent plan, so cache the model
+        # output cross-user by a digest of the request; the v1 suffix
+        # invalidates the cache if the prompt changes shape
+        cache_key = "planner:v1:" + hashlib.blake2b(
+            orjson.dumps(request.model_dump(), option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).hexdigest()
+
+        async def compute_plan():
+            # Generate plan using AI
+            gemini_service = get_gemini_service()
+
+            prompt = f"""
         Create a detailed study plan with the following requirements:
         - Subjects: {', '.join(request.subjects)}
         - Study hours per week: {request.study_hours_per_week}
@@ -67,39 +89,43 @@ async def generate_study_plan(
         }}
         """
         
-        ai_response = await gemini_service.generate_content(prompt)
-        
-        # Clean up response - remove markdown code blocks if present
-        import json
-        clean_response = ai_response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        plan_data = json.loads(clean_response)
-        
-        # Save to database
-        plan_id = str(uuid4())
+            ai_response = await gemini_service.generate_content(prompt)
+
+            # Strip any markdown code fence in one pass; keep the cleaned
+            # JSON as text so it can be handed to Postgres unparsed
+            plan_text = _FENCE.sub("", ai_response.strip()).strip()
+
+            # Validate before the value reaches the cache:
+            # generate_content degrades upstream failures to an apology
+            # string, and caching that would pin a 500 on this request
+            # digest for a day. A raise here propagates uncached.
+            parsed = orjson.loads(plan_text)
+            if not isinstance(parsed, dict) or "weeks" not in parsed:
+                raise ValueError("AI plan response missing 'weeks'")
+
+            return plan_text
+
+        plan_json = await cached(cache_key, ttl=86400, compute=compute_plan)
+
+        # One parse with the C-backed orjson for the fields the response
+        # needs; the insert reuses the raw string
+        plan_data = orjson.loads(plan_json)
+
+        # Postgres parses the JSON once and casts it to jsonb (see
+        # docs/database_migration_phase2.sql), so the plan structure is
+        # not re-serialized from Python dicts into the insert body
         supabase = get_supabase_client()
-        
-        supabase.table("study_plans").insert({
-            "id": plan_id,
-            "user_id": user["id"],
-            "subjects": request.subjects,
-            "study_hours_per_week": request.study_hours_per_week,
-            "difficulty_level": request.difficulty_level,
-            "focus_areas": request.focus_areas or [],
-            "schedule": plan_data["weeks"],
-            "milestones": plan_data.get("milestones", []),
-            "progress": {},
-            "status": "active",
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
-        
+
+        result = await run_db(supabase.rpc("create_study_plan", {
+            "p_user_id": user["id"],
+            "p_subjects": request.subjects,
+            "p_hours": request.study_hours_per_week,
+            "p_difficulty": request.difficulty_level,
+            "p_focus": request.focus_areas or [],
+            "p_plan_json": plan_json,
+        }).execute)
+        plan_id = result.data
+
         log_success(f"Generated study plan: {plan_id}", "PlannerRouter")
         
         return StudyPlanResponse(
@@ -117,38 +143,52 @@ async def generate_study_plan(
         raise HTTPException(status_code=500, detail=f"Failed to generate study plan: {str(e)}")
 
 
-@router.get("/plans", response_model=List[Dict[str, Any]])
-async def get_user_plans(user=Depends(get_current_user)):
-    """Get all study plans for the current user"""
-    
+@router.get("/plans")
+async def get_user_plans(
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    user=Depends(get_current_user)
+):
+    """Get study plans for the current user
+
+    Keyset-paginated: pass the returned next_cursor to fetch the next
+    page.
+    """
+
     try:
         supabase = get_supabase_client()
-        
-        result = supabase.table("study_plans").select("*").eq(
+
+        query = supabase.table("study_plans").select("*").eq(
             "user_id", user["id"]
-        ).order("created_at", desc=True).execute()
-        
+        ).is_("deleted_at", "null")
+
+        if cursor:
+            query = query.lt("created_at", cursor)
+
+        result = await run_db(query.order("created_at", desc=True).limit(limit).execute)
+
         plans = result.data or []
-        
+        next_cursor = plans[-1]["created_at"] if len(plans) == limit else None
+
         log_success(f"Retrieved {len(plans)} study plans", "PlannerRouter")
-        
-        return plans
-        
+
+        return {"plans": plans, "next_cursor": next_cursor}
+
     except Exception as e:
         log_error(e, "PlannerRouter.get_user_plans")
         raise HTTPException(status_code=500, detail="Failed to get study plans")
 
 
-@router.get("/plans/{plan_id}", response_model=Dict[str, Any])
+@router.get("/plans/{plan_id}")
 async def get_plan_details(plan_id: str, user=Depends(get_current_user)):
     """Get details of a specific study plan"""
     
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("study_plans").select("*").eq(
+        result = await run_db(supabase.table("study_plans").select("*").eq(
             "id", plan_id
-        ).eq("user_id", user["id"]).single().execute()
+        ).eq("user_id", user["id"]).is_("deleted_at", "null").single().execute)
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Study plan not found")
@@ -173,27 +213,30 @@ async def update_plan_progress(
     
     try:
         supabase = get_supabase_client()
-        
-        # Get current plan
-        result = supabase.table("study_plans").select("progress").eq(
-            "id", plan_id
-        ).eq("user_id", user["id"]).single().execute()
-        
+
+        # jsonb_set merges this day's flag server-side in one statement
+        # (see docs/database_migration_phase2.sql); concurrent updates to
+        # other days no longer clobber each other
+        result = await run_db(supabase.rpc("update_plan_day", {
+            "p_plan_id": plan_id,
+            "p_user_id": user["id"],
+            "p_day": str(day),
+            "p_done": session_completed,
+        }).execute)
+
         if not result.data:
             raise HTTPException(status_code=404, detail="Study plan not found")
-        
-        progress = result.data.get("progress", {})
-        progress[str(day)] = session_completed
-        
-        # Update progress
-        supabase.table("study_plans").update({
-            "progress": progress
-        }).eq("id", plan_id).execute()
-        
+
         log_success(f"Updated plan progress: {plan_id}", "PlannerRouter")
-        
-        return {"message": "Progress updated", "plan_id": plan_id}
-        
+
+        return {
+            "message": "Progress updated",
+            "plan_id": plan_id,
+            "progress": result.data[0]["progress"],
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(e, "PlannerRouter.update_plan_progress")
         raise HTTPException(status_code=500, detail="Failed to update progress")
@@ -206,9 +249,11 @@ async def delete_plan(plan_id: str, user=Depends(get_current_user)):
     try:
         supabase = get_supabase_client()
         
-        supabase.table("study_plans").delete().eq(
-            "id", plan_id
-        ).eq("user_id", user["id"]).execute()
+        # Soft delete: a one-column UPDATE instead of a DELETE; rows are
+        # purged out of band (see the phase-2 migration)
+        await run_db(supabase.table("study_plans").update(
+            {"deleted_at": datetime.utcnow().isoformat()}
+        ).eq("id", plan_id).eq("user_id", user["id"]).execute)
         
         log_success(f"Deleted study plan: {plan_id}", "PlannerRouter")
         
@@ -3,10 +3,10 @@ PYQ (Previous Year Questions) Router
 Handles question generation and answer evaluation
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List
+import asyncio
 import uuid
-from datetime import datetime
 
 from ..schemas import (
     PYQGenerateRequest,
@@ -16,9 +16,11 @@ from ..schemas import (
     PYQQuestion,
     PYQEvaluation
 )
+from ..services.points import award
 from ..services.pyq_service import PYQService
 from ..dependencies.auth import get_current_user
-from ..utils.supabase_client import get_supabase_client
+from ..utils.cache import cached
+from ..utils.supabase_client import get_supabase_client, run_db
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -28,7 +30,28 @@ router = APIRouter(prefix="/pyq", tags=["previous-year-questions"])
 pyq_service = PYQService()
 
 
-@router.post("/generate", response_model=PYQGenerateResponse)
+async def _question_max_marks(supabase, question_id: str) -> int:
+    """Marks for a question, cached: question rows are immutable after
+    generation, so an hour-long TTL just bounds cache size."""
+
+    async def fetch():
+        res = await run_db(
+            supabase.table("pyq_questions")
+            .select("marks")
+            .eq("id", question_id)
+            .execute
+        )
+        if res.data:
+            return res.data[0].get("marks", 10)
+        return 10  # Default
+
+    return await cached(f"pyq:marks:{question_id}", ttl=3600, compute=fetch)
+
+
+# No response_model: the questions are already validated below, and a
+# response_model would make FastAPI validate them a second time on the
+# way out
+@router.post("/generate")
 async def generate_pyq_questions(
     request: PYQGenerateRequest,
     current_user = Depends(get_current_user)
@@ -54,9 +77,10 @@ async def generate_pyq_questions(
         
         # Save questions to database for tracking
         supabase = get_supabase_client()
-        
-        for question in questions:
-            question_data = {
+
+        # created_at comes from the column default, stamped by the DB clock
+        rows = [
+            {
                 "id": question["id"],
                 "user_id": current_user["id"],
                 "subject": request.subject,
@@ -65,21 +89,27 @@ async def generate_pyq_questions(
                 "marks": question["marks"],
                 "difficulty": question["difficulty"],
                 "year": question.get("year", 2024),
-                "key_points": question.get("key_points", []),
-                "created_at": datetime.utcnow().isoformat()
+                "key_points": question.get("key_points", [])
             }
-            
-            # Use upsert to avoid duplicates
-            supabase.table("pyq_questions").upsert(question_data).execute()
+            for question in questions
+        ]
+
+        # One upsert for the whole batch (still deduplicating on id)
+        # instead of a round-trip per question
+        await run_db(supabase.table("pyq_questions").upsert(rows).execute)
         
         logger.info(f"Generated and saved {len(questions)} questions")
         
-        # Convert to response format
+        # model_validate skips the Python-level keyword binding of
+        # PYQQuestion(**q) and tolerates extra keys from the model output;
+        # this is the single validation pass for the AI output
         question_responses = [
-            PYQQuestion(**q) for q in questions
+            PYQQuestion.model_validate(q) for q in questions
         ]
-        
-        return PYQGenerateResponse(
+
+        # The envelope fields are trivially well-formed, so skip
+        # validating them again
+        return PYQGenerateResponse.model_construct(
             questions=question_responses,
             total_count=len(question_responses),
             subject=request.subject,
@@ -110,18 +140,13 @@ async def evaluate_pyq_answer(
     logger.info(f"Evaluating answer for question {submission.question_id}")
     
     try:
-        # Get question details to determine max marks
+        # Get question details to determine max marks; this has to land
+        # before the AI call because max_marks is part of the prompt, but
+        # the cached lookup usually skips the round-trip entirely
         supabase = get_supabase_client()
-        
-        question_result = supabase.table("pyq_questions")\
-            .select("marks")\
-            .eq("id", submission.question_id)\
-            .execute()
-        
-        max_marks = 10  # Default
-        if question_result.data:
-            max_marks = question_result.data[0].get("marks", 10)
-        
+
+        max_marks = await _question_max_marks(supabase, submission.question_id)
+
         # Evaluate answer using AI
         evaluation_data = await pyq_service.evaluate_answer(
             question_text=submission.question_text,
@@ -129,10 +154,10 @@ async def evaluate_pyq_answer(
             subject=submission.subject,
             max_marks=max_marks
         )
-        
+
         # Generate submission ID
         submission_id = str(uuid.uuid4())
-        
+
         # Save submission and evaluation to database
         submission_data = {
             "id": submission_id,
@@ -143,29 +168,23 @@ async def evaluate_pyq_answer(
             "subject": submission.subject,
             "score": evaluation_data["score"],
             "max_score": evaluation_data["max_score"],
-            "evaluation": evaluation_data,
-            "created_at": datetime.utcnow().isoformat()
+            "evaluation": evaluation_data
         }
-        
-        supabase.table("pyq_submissions").insert(submission_data).execute()
-        logger.info(f"Saved evaluation: {submission_id} (Score: {evaluation_data['score']}/{evaluation_data['max_score']})")
-        
-        # Update user points for gamification
+
         points_earned = int(evaluation_data["score"] * 10)  # 10 points per mark
-        
-        points_data = {
-            "user_id": current_user["id"],
-            "points": points_earned,
-            "action_type": "pyq_completed",
-            "reference_id": submission_id,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        supabase.table("user_points").insert(points_data).execute()
+
+        # The submission insert and the points award are independent, so
+        # run them concurrently; award() buffers through Redis when
+        # available and keeps the cached stats fresh
+        await asyncio.gather(
+            run_db(supabase.table("pyq_submissions").insert(submission_data).execute),
+            award(current_user["id"], points_earned, "pyq_completed", submission_id),
+        )
+        logger.info(f"Saved evaluation: {submission_id} (Score: {evaluation_data['score']}/{evaluation_data['max_score']})")
         logger.info(f"Awarded {points_earned} points to user")
         
         return PYQEvaluationResponse(
-            evaluation=PYQEvaluation(**evaluation_data),
+            evaluation=PYQEvaluation.model_validate(evaluation_data),
             submission_id=submission_id,
             status="success"
         )
@@ -181,30 +200,39 @@ async def evaluate_pyq_answer(
 @router.get("/questions/history")
 async def get_question_history(
     subject: str = None,
-    limit: int = 20,
-    offset: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user = Depends(get_current_user)
 ):
     """Get user's generated question history"""
     try:
         supabase = get_supabase_client()
         
+        # count="exact" returns the true total with the page in the same
+        # request (PostgREST sets it from the Content-Range header)
+        # List view: skip key_points, the bulkiest column, and the
+        # redundant user_id
         query = supabase.table("pyq_questions")\
-            .select("*")\
+            .select(
+                "id, subject, topic, question_text, marks, difficulty, year, created_at",
+                count="exact",
+            )\
             .eq("user_id", current_user["id"])
-        
+
         if subject:
             query = query.eq("subject", subject)
-        
-        result = query.order("created_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
-        
+
+        result = await run_db(
+            query.order("created_at", desc=True)
+            .range(offset, offset + limit - 1)
+            .execute
+        )
+
         logger.info(f"Retrieved {len(result.data)} questions for user")
-        
+
         return {
             "questions": result.data,
-            "total": len(result.data),
+            "total": result.count if result.count is not None else len(result.data),
             "limit": limit,
             "offset": offset
         }
@@ -217,30 +245,37 @@ async def get_question_history(
 @router.get("/submissions/history")
 async def get_submission_history(
     subject: str = None,
-    limit: int = 20,
-    offset: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user = Depends(get_current_user)
 ):
     """Get user's answer submission history"""
     try:
         supabase = get_supabase_client()
         
+        # List view: the full answer and evaluation blob stay out of the
+        # history payload; the detail fetch can load them when needed
         query = supabase.table("pyq_submissions")\
-            .select("*")\
+            .select(
+                "id, question_id, question_text, subject, score, max_score, created_at",
+                count="exact",
+            )\
             .eq("user_id", current_user["id"])
-        
+
         if subject:
             query = query.eq("subject", subject)
-        
-        result = query.order("created_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
-        
+
+        result = await run_db(
+            query.order("created_at", desc=True)
+            .range(offset, offset + limit - 1)
+            .execute
+        )
+
         logger.info(f"Retrieved {len(result.data)} submissions for user")
-        
+
         return {
             "submissions": result.data,
-            "total": len(result.data),
+            "total": result.count if result.count is not None else len(result.data),
             "limit": limit,
             "offset": offset
         }
@@ -257,14 +292,17 @@ async def get_pyq_stats(
     """Get user's PYQ performance statistics"""
     try:
         supabase = get_supabase_client()
-        
-        # Get all submissions
-        submissions = supabase.table("pyq_submissions")\
-            .select("score, max_score, subject, created_at")\
-            .eq("user_id", current_user["id"])\
-            .execute()
-        
-        if not submissions.data:
+
+        # Aggregated in SQL (see docs/database_migration_phase2.sql):
+        # totals, per-subject breakdown and the recent five come back as
+        # one JSON blob instead of every submission row
+        res = await run_db(supabase.rpc("get_pyq_stats", {
+            "p_user_id": current_user["id"],
+        }).execute)
+        stats = getattr(res, "data", None) or {}
+
+        total_submissions = int(stats.get("total_submissions") or 0)
+        if total_submissions == 0:
             return {
                 "total_submissions": 0,
                 "average_score": 0,
@@ -272,41 +310,19 @@ async def get_pyq_stats(
                 "subject_performance": {},
                 "recent_trend": []
             }
-        
-        # Calculate statistics
-        total_submissions = len(submissions.data)
-        total_score = sum(s["score"] for s in submissions.data)
-        total_max_score = sum(s["max_score"] for s in submissions.data)
+
+        total_score = stats.get("total_score") or 0
+        total_max_score = stats.get("total_max_score") or 0
         average_score = (total_score / total_max_score * 100) if total_max_score > 0 else 0
-        
-        # Subject-wise performance
-        subject_performance = {}
-        for sub in submissions.data:
-            subject = sub["subject"]
-            if subject not in subject_performance:
-                subject_performance[subject] = {
-                    "count": 0,
-                    "total_score": 0,
-                    "total_max_score": 0
-                }
-            
-            subject_performance[subject]["count"] += 1
-            subject_performance[subject]["total_score"] += sub["score"]
-            subject_performance[subject]["total_max_score"] += sub["max_score"]
-        
-        # Calculate percentages
-        for subject in subject_performance:
-            perf = subject_performance[subject]
-            perf["percentage"] = (perf["total_score"] / perf["total_max_score"] * 100) if perf["total_max_score"] > 0 else 0
-        
+
         logger.info(f"Retrieved PYQ stats for user: {total_submissions} submissions")
-        
+
         return {
             "total_submissions": total_submissions,
             "average_score": round(average_score, 2),
             "total_questions_attempted": total_submissions,
-            "subject_performance": subject_performance,
-            "recent_submissions": submissions.data[:5]  # Last 5
+            "subject_performance": stats.get("subject_performance") or {},
+            "recent_submissions": stats.get("recent_submissions") or []
         }
         
     except Exception as e:
@@ -323,11 +339,13 @@ async def get_question_hints(
     try:
         supabase = get_supabase_client()
         
-        # Get question details
-        question_result = supabase.table("pyq_questions")\
-            .select("*")\
-            .eq("id", question_id)\
-            .execute()
+        # Only the two columns the hint prompt needs
+        question_result = await run_db(
+            supabase.table("pyq_questions")
+            .select("question_text, subject")
+            .eq("id", question_id)
+            .execute
+        )
         
         if not question_result.data:
             raise HTTPException(status_code=404, detail="Question not found")
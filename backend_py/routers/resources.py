@@ -3,11 +3,93 @@ from typing import List, Optional
 from ..dependencies.auth import get_current_user
 from ..schemas import ResourceSearchRequest, ResourceResponse, ResourceList
 from ..services.tavily_service import get_tavily_service
+from ..utils.cache import cached
 from ..utils.logger import log_api_call, log_error, log_success
 import asyncio
 
 router = APIRouter(prefix="/api/resources", tags=["resources"])
 
+# Static catalogue data: built once at import instead of per request
+_SUBJECTS = [
+    {"id": "general", "name": "General", "description": "General programming topics"},
+    {"id": "dsa", "name": "DSA", "description": "Data Structures and Algorithms"},
+    {"id": "os", "name": "OS", "description": "Operating Systems"},
+    {"id": "dbms", "name": "DBMS", "description": "Database Management Systems"},
+    {"id": "cn", "name": "CN", "description": "Computer Networks"},
+    {"id": "se", "name": "SE", "description": "Software Engineering"},
+    {"id": "ai", "name": "AI", "description": "Artificial Intelligence"},
+    {"id": "ml", "name": "ML", "description": "Machine Learning"},
+    {"id": "web", "name": "Web Dev", "description": "Web Development"},
+    {"id": "mobile", "name": "Mobile Dev", "description": "Mobile Development"}
+]
+
+_RESOURCE_TYPES = [
+    {"id": "video", "name": "Video Tutorials", "description": "Video-based learning content"},
+    {"id": "course", "name": "Online Courses", "description": "Structured online courses"},
+    {"id": "documentation", "name": "Documentation", "description": "Technical documentation and guides"},
+    {"id": "practice", "name": "Practice Exercises", "description": "Coding exercises and problems"},
+    {"id": "paper", "name": "Academic Papers", "description": "Research papers and articles"}
+]
+
+_DIFFICULTIES = [
+    {"id": "beginner", "name": "Beginner", "description": "Introductory level content"},
+    {"id": "intermediate", "name": "Intermediate", "description": "Intermediate level content"},
+    {"id": "advanced", "name": "Advanced", "description": "Advanced level content"}
+]
+
+# Bounds the multi-subject fan-out so a long subject list can't hammer
+# Tavily's rate limit
+_FANOUT_SEMAPHORE = asyncio.Semaphore(8)
+
+
+async def _trending_for(tavily_service, subject: Optional[str], limit: int):
+    """Cached trending search for one subject; returns (query, resources)"""
+    if subject and subject != "General":
+        trending_query = f"trending {subject} programming tutorial course 2024"
+    else:
+        trending_query = "trending programming computer science tutorial course 2024"
+
+    async def fetch_trending():
+        async with _FANOUT_SEMAPHORE:
+            return await tavily_service.search_resources(
+                query=trending_query,
+                subject=subject,
+                max_results=limit
+            )
+
+    resources = await cached(
+        f"resources:trending:{subject}:{limit}", ttl=600,
+        compute=fetch_trending,
+    )
+    return trending_query, resources
+
+
+async def _recommended_for(tavily_service, subject: Optional[str],
+                           difficulty: Optional[str], limit: int):
+    """Cached recommendation search for one subject; returns (query, resources)"""
+    if subject and subject != "General":
+        rec_query = f"best {subject} learning resources tutorial course"
+    else:
+        rec_query = "best programming computer science learning resources tutorial course"
+
+    if difficulty:
+        rec_query += f" {difficulty} level"
+
+    async def fetch_recommended():
+        async with _FANOUT_SEMAPHORE:
+            return await tavily_service.search_resources(
+                query=rec_query,
+                subject=subject,
+                difficulty=difficulty,
+                max_results=limit
+            )
+
+    resources = await cached(
+        f"resources:recommended:{subject}:{difficulty}:{limit}", ttl=600,
+        compute=fetch_recommended,
+    )
+    return rec_query, resources
+
 @router.post("/search", response_model=ResourceList)
 async def search_resources(
     request: ResourceSearchRequest,
@@ -16,7 +98,12 @@ async def search_resources(
     """Search for educational resources using Tavily API"""
     
     try:
-        log_api_call("/api/resources/search", "POST", user["id"], **request.dict())
+        log_api_call(
+            "/api/resources/search", "POST", user["id"],
+            query_len=len(request.query),
+            subject=request.subject,
+            resource_type=request.resource_type,
+        )
         
         # Search for resources
         tavily_service = get_tavily_service()
@@ -48,37 +135,46 @@ async def search_resources(
 @router.get("/trending", response_model=ResourceList)
 async def get_trending_resources(
     subject: Optional[str] = Query(None, description="Filter by subject"),
+    subjects: Optional[List[str]] = Query(None, description="Fan out over several subjects"),
     limit: int = Query(10, description="Number of resources to return"),
     user=Depends(get_current_user)
 ):
-    """Get trending educational resources"""
-    
+    """Get trending educational resources
+
+    Pass subjects=A&subjects=B to fetch several subjects in one request;
+    the searches run concurrently, so latency is the slowest single
+    search rather than their sum.
+    """
+
     try:
-        log_api_call("/api/resources/trending", "GET", user["id"], subject=subject, limit=limit)
-        
-        # Build trending query based on subject
-        if subject and subject != "General":
-            trending_query = f"trending {subject} programming tutorial course 2024"
-        else:
-            trending_query = "trending programming computer science tutorial course 2024"
-        
-        # Search for trending resources
+        log_api_call("/api/resources/trending", "GET", user["id"],
+                     subject=subject, subjects=subjects, limit=limit)
+
+        # Trending is the same for every user asking about the same
+        # subject; a 10-minute cache absorbs most of the billed, slow
+        # Tavily calls
         tavily_service = get_tavily_service()
-        resources = await tavily_service.search_resources(
-            query=trending_query,
-            subject=subject,
-            max_results=limit
-        )
-        
+
+        if subjects:
+            results = await asyncio.gather(*[
+                _trending_for(tavily_service, s, limit) for s in subjects
+            ])
+            resources = [r for _, batch in results for r in batch]
+            trending_query = "; ".join(q for q, _ in results)
+            filters = {"subjects": subjects, "trending": True}
+        else:
+            trending_query, resources = await _trending_for(tavily_service, subject, limit)
+            filters = {"subject": subject, "trending": True}
+
         log_success(f"Found {len(resources)} trending resources", "ResourceRouter")
-        
+
         return ResourceList(
             resources=resources,
             total_count=len(resources),
             query=trending_query,
-            filters={"subject": subject, "trending": True}
+            filters=filters
         )
-        
+
     except Exception as e:
         log_error(e, "ResourceRouter.get_trending_resources")
         raise HTTPException(status_code=500, detail="Failed to get trending resources")
@@ -86,72 +182,74 @@ async def get_trending_resources(
 @router.get("/recommended", response_model=ResourceList)
 async def get_recommended_resources(
     subject: Optional[str] = Query(None, description="Filter by subject"),
+    subjects: Optional[List[str]] = Query(None, description="Fan out over several subjects"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty"),
     limit: int = Query(10, description="Number of resources to return"),
     user=Depends(get_current_user)
 ):
-    """Get recommended resources based on user preferences"""
-    
+    """Get recommended resources based on user preferences
+
+    Pass subjects=A&subjects=B to fetch several subjects concurrently.
+    """
+
     try:
-        log_api_call("/api/resources/recommended", "GET", user["id"], 
-                    subject=subject, difficulty=difficulty, limit=limit)
-        
-        # Build recommendation query
-        if subject and subject != "General":
-            rec_query = f"best {subject} learning resources tutorial course"
-        else:
-            rec_query = "best programming computer science learning resources tutorial course"
-        
-        if difficulty:
-            rec_query += f" {difficulty} level"
-        
-        # Search for recommended resources
+        log_api_call("/api/resources/recommended", "GET", user["id"],
+                    subject=subject, subjects=subjects, difficulty=difficulty, limit=limit)
+
+        # Recommendations only vary by the query inputs, not the user
         tavily_service = get_tavily_service()
-        resources = await tavily_service.search_resources(
-            query=rec_query,
-            subject=subject,
-            difficulty=difficulty,
-            max_results=limit
-        )
-        
+
+        if subjects:
+            results = await asyncio.gather(*[
+                _recommended_for(tavily_service, s, difficulty, limit) for s in subjects
+            ])
+            resources = [r for _, batch in results for r in batch]
+            rec_query = "; ".join(q for q, _ in results)
+            filters = {"subjects": subjects, "difficulty": difficulty, "recommended": True}
+        else:
+            rec_query, resources = await _recommended_for(
+                tavily_service, subject, difficulty, limit
+            )
+            filters = {"subject": subject, "difficulty": difficulty, "recommended": True}
+
         log_success(f"Found {len(resources)} recommended resources", "ResourceRouter")
-        
+
         return ResourceList(
             resources=resources,
             total_count=len(resources),
             query=rec_query,
-            filters={
-                "subject": subject,
-                "difficulty": difficulty,
-                "recommended": True
-            }
+            filters=filters
         )
         
     except Exception as e:
         log_error(e, "ResourceRouter.get_recommended_resources")
         raise HTTPException(status_code=500, detail="Failed to get recommended resources")
 
+@router.get("/meta")
+async def get_resource_meta(user=Depends(get_current_user)):
+    """All filter metadata in one call
+
+    Replaces the three separate /subjects, /types and /difficulties
+    requests the frontend fired on page load — one auth check and one
+    round-trip for the same static data. The individual endpoints remain
+    for older clients.
+    """
+
+    return {
+        "subjects": _SUBJECTS,
+        "resource_types": _RESOURCE_TYPES,
+        "difficulties": _DIFFICULTIES,
+    }
+
+
 @router.get("/subjects")
 async def get_available_subjects(user=Depends(get_current_user)):
     """Get list of available subjects for resource filtering"""
     
     try:
-        subjects = [
-            {"id": "general", "name": "General", "description": "General programming topics"},
-            {"id": "dsa", "name": "DSA", "description": "Data Structures and Algorithms"},
-            {"id": "os", "name": "OS", "description": "Operating Systems"},
-            {"id": "dbms", "name": "DBMS", "description": "Database Management Systems"},
-            {"id": "cn", "name": "CN", "description": "Computer Networks"},
-            {"id": "se", "name": "SE", "description": "Software Engineering"},
-            {"id": "ai", "name": "AI", "description": "Artificial Intelligence"},
-            {"id": "ml", "name": "ML", "description": "Machine Learning"},
-            {"id": "web", "name": "Web Dev", "description": "Web Development"},
-            {"id": "mobile", "name": "Mobile Dev", "description": "Mobile Development"}
-        ]
-        
         log_success("Retrieved available subjects", "ResourceRouter")
-        
-        return {"subjects": subjects}
+
+        return {"subjects": _SUBJECTS}
         
     except Exception as e:
         log_error(e, "ResourceRouter.get_available_subjects")
@@ -162,17 +260,9 @@ async def get_resource_types(user=Depends(get_current_user)):
     """Get list of available resource types"""
     
     try:
-        resource_types = [
-            {"id": "video", "name": "Video Tutorials", "description": "Video-based learning content"},
-            {"id": "course", "name": "Online Courses", "description": "Structured online courses"},
-            {"id": "documentation", "name": "Documentation", "description": "Technical documentation and guides"},
-            {"id": "practice", "name": "Practice Exercises", "description": "Coding exercises and problems"},
-            {"id": "paper", "name": "Academic Papers", "description": "Research papers and articles"}
-        ]
-        
         log_success("Retrieved resource types", "ResourceRouter")
-        
-        return {"resource_types": resource_types}
+
+        return {"resource_types": _RESOURCE_TYPES}
         
     except Exception as e:
         log_error(e, "ResourceRouter.get_resource_types")
@@ -183,15 +273,9 @@ async def get_difficulty_levels(user=Depends(get_current_user)):
     """Get list of available difficulty levels"""
     
     try:
-        difficulties = [
-            {"id": "beginner", "name": "Beginner", "description": "Introductory level content"},
-            {"id": "intermediate", "name": "Intermediate", "description": "Intermediate level content"},
-            {"id": "advanced", "name": "Advanced", "description": "Advanced level content"}
-        ]
-        
         log_success("Retrieved difficulty levels", "ResourceRouter")
-        
-        return {"difficulties": difficulties}
+
+        return {"difficulties": _DIFFICULTIES}
         
     except Exception as e:
         log_error(e, "ResourceRouter.get_difficulty_levels")
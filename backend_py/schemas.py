@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, List, Any
 
 
@@ -253,6 +253,10 @@ class PYQGenerateRequest(BaseModel):
 
 
 class PYQQuestion(BaseModel):
+    # Built from AI-generated dicts on the hot generate path: ignore any
+    # extra keys the model emits instead of failing validation
+    model_config = ConfigDict(extra="ignore")
+
     id: str
     question: str
     marks: int
@@ -277,6 +281,8 @@ class PYQAnswerSubmission(BaseModel):
 
 
 class PYQEvaluation(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     score: float
     max_score: float
     feedback: str
@@ -3,13 +3,49 @@ Audio Transcription Service using AssemblyAI
 Handles audio file transcription with chapter detection
 """
 
+import asyncio
+import hashlib
 import os
-from typing import Dict, List, Optional
+import random
+from typing import AsyncIterator, Dict, List, Optional
 import assemblyai as aai
+import diskcache
+import orjson
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Transcription results are cached on disk, keyed by audio content, so
+# re-uploading the same lecture returns in milliseconds instead of
+# repeating a 10-60s (and billed) cloud transcription
+_TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "cache/transcripts")
+_TRANSCRIPT_CACHE_TTL_SECONDS = 30 * 86400
+
+# Files up to twice this size are hashed in full; larger ones hash the
+# first and last sample plus the size, which is ample to identify an
+# audio file without reading gigabytes
+_HASH_SAMPLE_BYTES = 1024 * 1024
+
+# Retry schedule for transient AssemblyAI failures (429s and 5xx)
+_MAX_ATTEMPTS = 5
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_CAP_SECONDS = 15.0
+
+# A single process stays far below AssemblyAI's 20k-per-5-min request
+# ceiling, so the practical protections are a cap on in-flight jobs and
+# backing off when the API says so
+_API_CONCURRENCY = 16
+
+
+def _is_retryable(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return (
+        "429" in message
+        or "rate limit" in message
+        or "too many requests" in message
+        or any(code in message for code in ("500", "502", "503", "504"))
+    )
+
 
 class AudioTranscriptionService:
     """Service for transcribing audio files using AssemblyAI"""
@@ -24,6 +60,63 @@ class AudioTranscriptionService:
             aai.settings.api_key = api_key
             self.client = aai.Transcriber()
             logger.info("AudioTranscriptionService initialized successfully")
+        self._api_semaphore = asyncio.Semaphore(_API_CONCURRENCY)
+        self._transcript_cache = diskcache.Cache(_TRANSCRIPT_CACHE_DIR)
+
+    @staticmethod
+    def _hash_audio(audio_file_path: str) -> str:
+        """Content digest of an audio file for cache keying"""
+        size = os.path.getsize(audio_file_path)
+        digest = hashlib.sha256()
+        digest.update(str(size).encode())
+        with open(audio_file_path, "rb") as f:
+            if size <= 2 * _HASH_SAMPLE_BYTES:
+                for chunk in iter(lambda: f.read(_HASH_SAMPLE_BYTES), b""):
+                    digest.update(chunk)
+            else:
+                digest.update(f.read(_HASH_SAMPLE_BYTES))
+                f.seek(-_HASH_SAMPLE_BYTES, os.SEEK_END)
+                digest.update(f.read(_HASH_SAMPLE_BYTES))
+        return digest.hexdigest()
+
+    async def _cache_key_for(self, audio_file_path: str, variant: str) -> Optional[str]:
+        """Cache key for a local file, or None for URLs / unreadable paths"""
+        if not os.path.isfile(audio_file_path):
+            return None
+        try:
+            # Hashing reads up to 2 MiB, so keep it off the event loop
+            digest = await asyncio.to_thread(self._hash_audio, audio_file_path)
+        except OSError as e:
+            logger.warning("Could not hash audio file for caching: {}", e)
+            return None
+        return f"{digest}:{variant}"
+
+    async def _transcribe_call(self, audio_file_path: str, config=None) -> "aai.Transcript":
+        """Run one SDK transcribe call off-loop, throttled and retried
+
+        Retries 429/5xx responses with exponential backoff plus jitter so
+        a burst degrades into a short wait instead of a retry storm; other
+        errors propagate immediately.
+        """
+        delay = _BACKOFF_BASE_SECONDS
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            try:
+                async with self._api_semaphore:
+                    if config is not None:
+                        return await asyncio.to_thread(
+                            self.client.transcribe, audio_file_path, config=config
+                        )
+                    return await asyncio.to_thread(self.client.transcribe, audio_file_path)
+            except Exception as e:
+                if attempt == _MAX_ATTEMPTS or not _is_retryable(e):
+                    raise
+                wait = min(delay, _BACKOFF_CAP_SECONDS) + random.uniform(0, delay / 2)
+                logger.warning(
+                    "Transient AssemblyAI error (attempt {}/{}), retrying in {:.1f}s: {}",
+                    attempt, _MAX_ATTEMPTS, wait, e,
+                )
+                await asyncio.sleep(wait)
+                delay *= 2
     
     async def transcribe_audio(
         self, 
@@ -44,17 +137,28 @@ class AudioTranscriptionService:
             logger.error("AssemblyAI client not initialized - missing API key")
             raise ValueError("AssemblyAI service is not configured. Please add ASSEMBLYAI_API_KEY to environment variables.")
         
+        # Identical audio with the same options replays the cached result
+        # instead of re-uploading and re-billing
+        cache_key = await self._cache_key_for(audio_file_path, f"chapters={enable_chapters}")
+        if cache_key is not None:
+            hit = self._transcript_cache.get(cache_key)
+            if hit is not None:
+                logger.info(f"Transcription cache hit for: {audio_file_path}")
+                return hit
+
         try:
             logger.info(f"Starting transcription for file: {audio_file_path}")
-            
+
             # Configure transcription
             config = aai.TranscriptionConfig(
                 auto_chapters=enable_chapters,
                 speaker_labels=False
             )
             
-            # Transcribe
-            transcript = self.client.transcribe(audio_file_path, config=config)
+            # The SDK blocks for the whole upload-and-poll cycle (seconds
+            # to minutes), so run it on a worker thread; the event loop
+            # keeps serving other requests meanwhile
+            transcript = await self._transcribe_call(audio_file_path, config=config)
             
             if transcript.status == aai.TranscriptStatus.error:
                 logger.error(f"Transcription failed: {transcript.error}")
@@ -83,7 +187,10 @@ class AudioTranscriptionService:
                     for chapter in transcript.chapters
                 ]
                 logger.info(f"Extracted {len(result['chapters'])} chapters from audio")
-            
+
+            if cache_key is not None:
+                self._transcript_cache.set(cache_key, result, expire=_TRANSCRIPT_CACHE_TTL_SECONDS)
+
             return result
             
         except Exception as e:
@@ -106,10 +213,17 @@ class AudioTranscriptionService:
         if not self.client:
             raise ValueError("AssemblyAI service is not configured")
         
+        cache_key = await self._cache_key_for(audio_file_path, "timestamps")
+        if cache_key is not None:
+            hit = self._transcript_cache.get(cache_key)
+            if hit is not None:
+                logger.info(f"Transcription cache hit for: {audio_file_path}")
+                return hit
+
         try:
             logger.info(f"Starting transcription with timestamps: {audio_file_path}")
-            
-            transcript = self.client.transcribe(audio_file_path)
+
+            transcript = await self._transcribe_call(audio_file_path)
             
             if transcript.status == aai.TranscriptStatus.error:
                 logger.error(f"Transcription failed: {transcript.error}")
@@ -128,17 +242,105 @@ class AudioTranscriptionService:
                 ]
             
             logger.info(f"Transcription with timestamps completed. Words: {len(words_with_timestamps)}")
-            
-            return {
+
+            result = {
                 "text": transcript.text,
                 "words": words_with_timestamps,
                 "duration": transcript.audio_duration if hasattr(transcript, 'audio_duration') else None
             }
+
+            if cache_key is not None:
+                self._transcript_cache.set(cache_key, result, expire=_TRANSCRIPT_CACHE_TTL_SECONDS)
+
+            return result
             
         except Exception as e:
             logger.error(f"Error during timestamped transcription: {str(e)}", exc_info=True)
             raise
     
+    async def stream_words(
+        self,
+        audio_file_path: str,
+        chunk_size: int = 1000
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield word-level timestamps as fragments of one JSON array
+
+        A two-hour recording carries tens of thousands of words; this
+        serializes them in chunk_size batches with orjson so peak memory
+        is one batch rather than the whole list of dicts, and the bytes
+        can feed a StreamingResponse directly.
+
+        Args:
+            audio_file_path: Path to audio file or URL
+            chunk_size: Words serialized per yielded fragment
+
+        Yields:
+            Byte fragments that concatenate to a valid JSON array
+        """
+        if not self.client:
+            raise ValueError("AssemblyAI service is not configured")
+
+        transcript = await self._transcribe_call(audio_file_path)
+
+        if transcript.status == aai.TranscriptStatus.error:
+            logger.error(f"Transcription failed: {transcript.error}")
+            raise Exception(f"Transcription failed: {transcript.error}")
+
+        words = getattr(transcript, 'words', None) or []
+        logger.info(f"Streaming {len(words)} words in chunks of {chunk_size}")
+
+        yield b"["
+        for start in range(0, len(words), chunk_size):
+            batch = orjson.dumps([
+                {
+                    "text": word.text,
+                    "start": word.start,
+                    "end": word.end,
+                    "confidence": word.confidence
+                }
+                for word in words[start:start + chunk_size]
+            ])
+            # Strip the batch's own brackets; the surrounding yields
+            # supply the array delimiters once
+            yield (b"," if start else b"") + batch[1:-1]
+        yield b"]"
+
+    async def transcribe_many(
+        self,
+        audio_file_paths: List[str],
+        max_concurrency: int = 8,
+        enable_chapters: bool = True
+    ) -> List:
+        """
+        Transcribe several audio files concurrently
+
+        Args:
+            audio_file_paths: Paths or URLs of the files to transcribe
+            max_concurrency: Upper bound on in-flight AssemblyAI jobs
+            enable_chapters: Whether to enable automatic chapter detection
+
+        Returns:
+            One entry per input, in order: the transcription dict, or the
+            exception that file raised (callers check with isinstance)
+        """
+        if not self.client:
+            raise ValueError("AssemblyAI service is not configured")
+
+        # The semaphore keeps a large batch from saturating the thread
+        # pool and AssemblyAI's rate limit; wall-clock approaches the
+        # slowest max_concurrency-sized window instead of the sum
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def transcribe_one(path: str):
+            async with semaphore:
+                return await self.transcribe_audio(path, enable_chapters=enable_chapters)
+
+        return await asyncio.gather(
+            *(transcribe_one(path) for path in audio_file_paths),
+            return_exceptions=True
+        )
+
     def check_service_health(self) -> bool:
         """Check if the service is properly configured"""
         return self.client is not None
@@ -3,14 +3,86 @@ Flashcard Generation Service using Gemini AI
 Generates flashcards from notes and content with spaced repetition
 """
 
-import json
+import asyncio
+import re
+
+import orjson
 from typing import List, Dict
-from .gemini import GeminiService
+from .gemini import GeminiService, extract_json_payload
 from ..utils.logger import get_logger
 from datetime import datetime, timedelta
 
 logger = get_logger(__name__)
 
+# Finds "<term> is/are <definition>" sentences in one scan of the
+# content; re.I replaces the per-sentence .lower() copies. The minimum
+# sentence length is enforced on the whole match, not the term, so short
+# subjects ("Python is ...") still produce cards.
+_DEF_RE = re.compile(r"([A-Z][^.?!]*?)\s+(?:is|are)\s+([^.?!]+)[.?!]", re.I)
+_MIN_SENTENCE_LEN = 10
+
+# SuperMemo SM-2 interval multipliers; "again" resets to a one-day
+# interval rather than scaling
+_SM2_MULT = {
+    "hard": 1.2,   # Slight increase
+    "good": 2.5,   # Standard increase
+    "easy": 3.0    # Large increase
+}
+
+# Prompt skeletons are built once at import; per-call work is a single
+# .format() substituting count/difficulty/content
+_PROMPT_TMPL = """Generate {count} high-quality flashcards from the following content.
+            Difficulty level: {difficulty}
+
+            Requirements:
+            - Create clear, specific questions that test understanding
+            - Provide concise, accurate answers
+            - Include helpful hints where appropriate
+            - Vary question types (definition, application, comparison, etc.)
+            - Ensure questions are self-contained and unambiguous
+
+            Format the output as a JSON array with this exact structure:
+            [
+                {{
+                    "question": "Clear, specific question text",
+                    "answer": "Concise, accurate answer",
+                    "difficulty": "{difficulty}",
+                    "hint": "Optional helpful hint (can be null)"
+                }}
+            ]
+
+            Content to generate flashcards from:
+            {content}
+
+            Return ONLY the JSON array, no additional text or markdown formatting."""
+
+_BATCH_PROMPT_TMPL = """Generate {count} high-quality flashcards for EACH of the following notes.
+        Difficulty level: {difficulty}
+
+        Requirements:
+        - Create clear, specific questions that test understanding
+        - Provide concise, accurate answers
+        - Include helpful hints where appropriate
+        - Only use the content of a note for that note's flashcards
+
+        Format the output as a single JSON object mapping each note ID to its
+        flashcard array, with this exact structure:
+        {{
+            "<note_id>": [
+                {{
+                    "question": "Clear, specific question text",
+                    "answer": "Concise, accurate answer",
+                    "difficulty": "{difficulty}",
+                    "hint": "Optional helpful hint (can be null)"
+                }}
+            ]
+        }}
+
+        Notes:
+        {sections}
+
+        Return ONLY the JSON object, no additional text or markdown formatting."""
+
 
 class FlashcardService:
     """Service for generating and managing flashcards"""
@@ -40,71 +112,25 @@ class FlashcardService:
         try:
             logger.info(f"Generating {count} flashcards with {difficulty} difficulty")
             
-            prompt = f"""Generate {count} high-quality flashcards from the following content.
-            Difficulty level: {difficulty}
-            
-            Requirements:
-            - Create clear, specific questions that test understanding
-            - Provide concise, accurate answers
-            - Include helpful hints where appropriate
-            - Vary question types (definition, application, comparison, etc.)
-            - Ensure questions are self-contained and unambiguous
-            
-            Format the output as a JSON array with this exact structure:
-            [
-                {{
-                    "question": "Clear, specific question text",
-                    "answer": "Concise, accurate answer",
-                    "difficulty": "{difficulty}",
-                    "hint": "Optional helpful hint (can be null)"
-                }}
-            ]
-            
-            Content to generate flashcards from:
-            {content}
-            
-            Return ONLY the JSON array, no additional text or markdown formatting."""
-            
-            response = await self.gemini.generate_content(prompt)
-            
-            # Clean and parse JSON response
-            json_text = response.strip()
-            
-            # Remove markdown code blocks if present
-            if json_text.startswith("```json"):
-                json_text = json_text[7:]
-            if json_text.startswith("```"):
-                json_text = json_text[3:]
-            if json_text.endswith("```"):
-                json_text = json_text[:-3]
-            
-            json_text = json_text.strip()
-            
-            # Parse JSON
-            flashcards = json.loads(json_text)
+            prompt = _PROMPT_TMPL.format(count=count, difficulty=difficulty, content=content)
+
+            response = await self.gemini.generate_content(prompt, json_response=True)
+
+            # JSON mode returns a bare document; the fence extractor is a
+            # cheap no-op safety net, and orjson's C parser decodes it
+            flashcards = orjson.loads(extract_json_payload(response))
             
             # Validate structure
             if not isinstance(flashcards, list):
                 logger.error("Generated flashcards is not a list")
                 raise ValueError("Invalid flashcard format returned by AI")
-            
-            # Ensure all required fields
-            validated_flashcards = []
-            for idx, card in enumerate(flashcards):
-                if "question" in card and "answer" in card:
-                    validated_flashcards.append({
-                        "question": card["question"],
-                        "answer": card["answer"],
-                        "difficulty": card.get("difficulty", difficulty),
-                        "hint": card.get("hint")
-                    })
-                else:
-                    logger.warning(f"Skipping invalid flashcard at index {idx}")
-            
+
+            validated_flashcards = self._validate_cards(flashcards, difficulty)
+
             logger.info(f"Successfully generated {len(validated_flashcards)} flashcards")
             return validated_flashcards
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON response: {str(e)}")
             logger.debug(f"Raw response: {response}")
             
@@ -115,6 +141,21 @@ class FlashcardService:
             logger.error(f"Error generating flashcards: {str(e)}", exc_info=True)
             raise
     
+    def _validate_cards(self, flashcards: List[Dict], difficulty: str) -> List[Dict]:
+        """Keep only cards with the required fields, normalizing the rest"""
+        validated = []
+        for idx, card in enumerate(flashcards):
+            if isinstance(card, dict) and "question" in card and "answer" in card:
+                validated.append({
+                    "question": card["question"],
+                    "answer": card["answer"],
+                    "difficulty": card.get("difficulty", difficulty),
+                    "hint": card.get("hint")
+                })
+            else:
+                logger.warning(f"Skipping invalid flashcard at index {idx}")
+        return validated
+
     def _fallback_extraction(
         self, 
         content: str, 
@@ -126,29 +167,23 @@ class FlashcardService:
         Uses simple pattern matching to create basic flashcards
         """
         logger.info("Using fallback extraction method")
-        
+
+        # One pass over the content: the compiled pattern splits each
+        # definition sentence into term and definition as it matches,
+        # replacing the split/lower/split-again passes per sentence
         flashcards = []
-        sentences = content.split('.')
-        
-        for sentence in sentences[:count]:
-            sentence = sentence.strip()
-            if len(sentence) < 10:
+        for match in _DEF_RE.finditer(content):
+            if len(match.group(0).strip()) < _MIN_SENTENCE_LEN:
                 continue
-            
-            # Look for definition patterns
-            if ' is ' in sentence.lower() or ' are ' in sentence.lower():
-                parts = sentence.split(' is ' if ' is ' in sentence else ' are ', 1)
-                if len(parts) == 2:
-                    flashcards.append({
-                        "question": f"What is {parts[0].strip()}?",
-                        "answer": parts[1].strip(),
-                        "difficulty": difficulty,
-                        "hint": None
-                    })
-            
+            flashcards.append({
+                "question": f"What is {match.group(1).strip()}?",
+                "answer": match.group(2).strip(),
+                "difficulty": difficulty,
+                "hint": None
+            })
             if len(flashcards) >= count:
                 break
-        
+
         logger.info(f"Fallback extraction created {len(flashcards)} flashcards")
         return flashcards
     
@@ -167,15 +202,10 @@ class FlashcardService:
         Returns:
             Dictionary with next review date and interval
         """
-        # SuperMemo SM-2 algorithm intervals
-        intervals = {
-            "again": 1,      # Review again tomorrow
-            "hard": max(1, int(current_interval * 1.2)),    # Slight increase
-            "good": max(1, int(current_interval * 2.5)),    # Standard increase
-            "easy": max(1, int(current_interval * 3.0))     # Large increase
-        }
-        
-        next_interval = intervals.get(performance, 1)
+        # Only the chosen branch is computed; the multiplier table lives
+        # at module scope instead of being rebuilt per call
+        mult = _SM2_MULT.get(performance)
+        next_interval = max(1, int(current_interval * mult)) if mult else 1
         next_review_date = datetime.now() + timedelta(days=next_interval)
         
         logger.debug(f"Calculated next review: {next_interval} days (performance: {performance})")
@@ -206,8 +236,85 @@ class FlashcardService:
         logger.info(f"Generating flashcards from note: {note_title}")
         
         enhanced_content = f"""Note Title: {note_title}
-        
+
 Content:
 {note_content}"""
-        
+
         return await self.generate_flashcards(enhanced_content, count)
+
+    async def generate_from_notes(
+        self,
+        notes: List[tuple],
+        count: int = 5,
+        difficulty: str = "medium"
+    ) -> Dict[str, List[Dict]]:
+        """
+        Generate flashcards for several notes in one model call
+
+        A single prompt covering all notes replaces one full model round
+        trip per note, so the wall-clock cost stays close to a single
+        generation regardless of how many notes are selected.
+
+        Args:
+            notes: (note_id, title, content) tuples to generate cards for
+            count: Number of flashcards to generate per note
+            difficulty: Difficulty level (easy, medium, hard)
+
+        Returns:
+            Mapping of note_id to its list of generated flashcards
+        """
+        if not notes:
+            return {}
+
+        if len(notes) == 1:
+            note_id, title, content = notes[0]
+            return {note_id: await self.generate_from_note(content, title, count)}
+
+        logger.info(f"Generating flashcards for {len(notes)} notes in one batch")
+
+        sections = "\n\n".join(
+            f"Note ID: {note_id}\nTitle: {title}\nContent:\n{content}"
+            for note_id, title, content in notes
+        )
+
+        prompt = _BATCH_PROMPT_TMPL.format(count=count, difficulty=difficulty, sections=sections)
+
+        try:
+            response = await self.gemini.generate_content(prompt, json_response=True)
+            by_note = orjson.loads(extract_json_payload(response))
+
+            if not isinstance(by_note, dict):
+                raise ValueError("Batched flashcard response is not an object")
+
+            results = {
+                note_id: self._validate_cards(by_note.get(note_id) or [], difficulty)
+                for note_id, _title, _content in notes
+            }
+
+            logger.info(
+                f"Batch generated {sum(len(c) for c in results.values())} flashcards "
+                f"for {len(notes)} notes"
+            )
+            return results
+
+        except (orjson.JSONDecodeError, ValueError) as e:
+            # The model occasionally breaks the multi-note contract; fall
+            # back to one generation per note rather than failing the batch
+            logger.warning(f"Batched flashcard parse failed, falling back per note: {e}")
+
+            per_note = await asyncio.gather(
+                *(
+                    self.generate_from_note(content, title, count)
+                    for _note_id, title, content in notes
+                ),
+                return_exceptions=True
+            )
+
+            results = {}
+            for (note_id, _title, _content), cards in zip(notes, per_note):
+                if isinstance(cards, Exception):
+                    logger.error(f"Fallback generation failed for note {note_id}: {cards}")
+                    results[note_id] = []
+                else:
+                    results[note_id] = cards
+            return results
@@ -1,10 +1,29 @@
+import hashlib
 import os
-import json
+import re
 import google.generativeai as genai
+import orjson
+from cachetools import TTLCache
 from functools import lru_cache
 from typing import Optional, Dict, Any, List
 from ..test_mode import is_test_mode, get_test_response
 
+# Grabs the JSON payload out of a markdown code fence in a single scan;
+# the inner group anchors on the first bracket so fence language tags and
+# stray whitespace never reach the parser
+_FENCED_JSON = re.compile(r"```(?:json)?\s*([\[{].*?[\]}])\s*```", re.S)
+
+
+def extract_json_payload(response: str) -> str:
+    """Return the JSON text inside a markdown fence, or the stripped response"""
+    m = _FENCED_JSON.search(response)
+    return m.group(1) if m else response.strip()
+
+
+# Asks the model for a bare JSON document, so responses skip the
+# markdown code fences (and their tokens) entirely
+_JSON_GENERATION_CONFIG = genai.GenerationConfig(response_mime_type="application/json")
+
 
 @lru_cache(maxsize=1)
 def _configure_client():
@@ -20,64 +39,138 @@ class GeminiService:
     
     def __init__(self):
         self.model_name = "gemini-1.5-flash"
-    
-    def generate_content(self, prompt: str, system_instruction: Optional[str] = None) -> str:
-        """Generate content using Gemini AI"""
+        # Exact-match response cache: identical prompts (regenerating
+        # cards for the same note, repeated plan requests) return in
+        # microseconds instead of a ~1s model round-trip
+        self._response_cache: TTLCache = TTLCache(maxsize=10_000, ttl=86400)
+        # Built lazily on first use so a missing GEMINI_API_KEY degrades
+        # to the apology string instead of crashing import, then reused
+        # for every call
+        self._model: Optional[genai.GenerativeModel] = None
+
+    def _get_model(self) -> genai.GenerativeModel:
+        if self._model is None:
+            _configure_client()
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _cache_key(self, prompt: str, system_instruction: Optional[str], json_response: bool) -> str:
+        return hashlib.blake2b(
+            f"{system_instruction or ''}\x00{prompt}\x00{self.model_name}\x00{int(json_response)}".encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    @staticmethod
+    def _full_prompt(prompt: str, system_instruction: Optional[str]) -> str:
+        if system_instruction:
+            return f"{system_instruction}\n\n{prompt}"
+        return prompt
+
+    def _finish_response(self, cache_key: str, resp) -> str:
+        """Extract text from a model response, caching successful output"""
+        text = getattr(resp, "text", None)
+
+        if text:
+            self._response_cache[cache_key] = text
+            return text
+
+        # Fallback assemble from parts
+        parts = []
+        for cand in getattr(resp, "candidates", []) or []:
+            for part in getattr(cand, "content", {}).get("parts", []):
+                val = getattr(part, "text", None) or part.get("text") if isinstance(part, dict) else None
+                if val:
+                    parts.append(val)
+
+        if parts:
+            text = "\n".join(parts)
+            self._response_cache[cache_key] = text
+            return text
+
+        # Error/empty responses are never cached, so a transient
+        # failure doesn't pin an apology for 24 hours
+        return "I'm sorry, I couldn't generate a response right now."
+
+    async def generate_content(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        json_response: bool = False,
+    ) -> str:
+        """Generate content using Gemini AI
+
+        Natively async: the HTTP round trip runs on the event loop via
+        generate_content_async, so concurrent generations overlap instead
+        of blocking the loop (or a worker thread) one at a time.
+
+        With json_response=True the model is constrained to emit a bare
+        JSON document (no markdown fences), making the parse path
+        deterministic for structured callers.
+        """
+        if is_test_mode():
+            return get_test_response()
+
+        cache_key = self._cache_key(prompt, system_instruction, json_response)
+        hit = self._response_cache.get(cache_key)
+        if hit is not None:
+            return hit
+
+        try:
+            model = self._get_model()
+            resp = await model.generate_content_async(
+                self._full_prompt(prompt, system_instruction),
+                generation_config=_JSON_GENERATION_CONFIG if json_response else None,
+            )
+            return self._finish_response(cache_key, resp)
+
+        except Exception as e:
+            print(f"Error in generate_content: {e}")
+            return "I'm sorry, I couldn't generate a response right now. Please check your API keys."
+
+    def generate_content_sync(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        json_response: bool = False,
+    ) -> str:
+        """Blocking variant for callers outside the event loop
+
+        Used by the PDF pipeline and by chat's asyncio.to_thread path;
+        shares the cache and response handling with the async method.
+        """
         if is_test_mode():
             return get_test_response()
-        
+
+        cache_key = self._cache_key(prompt, system_instruction, json_response)
+        hit = self._response_cache.get(cache_key)
+        if hit is not None:
+            return hit
+
         try:
-            _configure_client()
-            model = genai.GenerativeModel(self.model_name)
-            
-            full_prompt = prompt
-            if system_instruction:
-                full_prompt = f"{system_instruction}\n\n{prompt}"
-            
-            resp = model.generate_content(full_prompt)
-            text = getattr(resp, "text", None)
-            
-            if text:
-                return text
-            
-            # Fallback assemble from parts
-            parts = []
-            for cand in getattr(resp, "candidates", []) or []:
-                for part in getattr(cand, "content", {}).get("parts", []):
-                    val = getattr(part, "text", None) or part.get("text") if isinstance(part, dict) else None
-                    if val:
-                        parts.append(val)
-            
-            return "\n".join(parts) if parts else "I'm sorry, I couldn't generate a response right now."
-        
+            model = self._get_model()
+            resp = model.generate_content(
+                self._full_prompt(prompt, system_instruction),
+                generation_config=_JSON_GENERATION_CONFIG if json_response else None,
+            )
+            return self._finish_response(cache_key, resp)
+
         except Exception as e:
             print(f"Error in generate_content: {e}")
             return "I'm sorry, I couldn't generate a response right now. Please check your API keys."
-    
-    def generate_structured_content(self, prompt: str, system_instruction: Optional[str] = None) -> Dict[str, Any]:
+
+    async def generate_structured_content(self, prompt: str, system_instruction: Optional[str] = None) -> Dict[str, Any]:
         """Generate structured JSON content using Gemini AI"""
         if is_test_mode():
             return {"response": get_test_response()}
-        
+
         try:
-            response_text = self.generate_content(prompt, system_instruction)
-            
-            # Try to extract JSON from response
-            # Look for JSON between ```json and ``` or just parse the whole response
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            else:
-                json_text = response_text.strip()
-            
-            return json.loads(json_text)
-        
-        except json.JSONDecodeError as e:
+            response_text = await self.generate_content(prompt, system_instruction, json_response=True)
+
+            # JSON mode returns a bare document; the fence extractor is a
+            # no-op on it and only kicks in for cached pre-JSON-mode output
+            return orjson.loads(extract_json_payload(response_text))
+
+        except orjson.JSONDecodeError as e:
             print(f"Error parsing JSON from Gemini response: {e}")
             return {"error": "Failed to parse structured response", "raw_response": response_text}
         except Exception as e:
@@ -101,4 +194,4 @@ def generate_chat_reply(prompt: str, subject: str | None = None) -> str:
     """Generate a chat reply using Gemini AI (backward compatibility function)"""
     service = get_gemini_service()
     system_instruction = f"You are a helpful CS study assistant. Subject: {subject}." if subject else "You are a helpful CS study assistant."
-    return service.generate_content(prompt, system_instruction)
+    return service.generate_content_sync(prompt, system_instruction)
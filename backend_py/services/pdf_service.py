@@ -28,10 +28,10 @@ class PDFProcessingService:
             filename = f"{file_id}_{file.filename}"
             file_path = os.path.join(self.upload_dir, filename)
             
-            # Save uploaded file
+            # Save uploaded file in chunks to keep memory bounded
             async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+                while chunk := await file.read(1024 * 1024):
+                    await f.write(chunk)
             
             log_file_operation("uploaded", filename, user_id=user_id)
             
@@ -0,0 +1,201 @@
+"""
+Points Service
+Buffers user_points writes so hot actions (flashcard reviews, generation)
+award points without a synchronous database round-trip
+
+When Redis is configured, awards increment a per-user counter and append
+to a `points_events` stream; a background flusher drains the stream into
+`user_points` in bulk. Without Redis, awards fall back to a direct insert
+so behaviour is unchanged in local development.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from ..utils.cache import get_redis, invalidate_user_stats
+from ..utils.supabase_client import get_supabase_client, run_db
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+POINTS_STREAM = "points_events"
+POINTS_FLUSH_GROUP = "points_flush"
+FLUSH_INTERVAL_SECONDS = 10
+FLUSH_BATCH_SIZE = 500
+
+# Entries read by a flusher that died before acknowledging them are
+# reclaimed by another worker after this long
+PENDING_CLAIM_IDLE_MS = 60_000
+
+
+async def award(user_id: str, points: int, action_type: str, reference_id: str = None) -> None:
+    """Award points to a user, deferring the database write when possible
+
+    Args:
+        user_id: ID of the user receiving points
+        points: Points to award
+        action_type: Action that earned the points (e.g. flashcard_reviewed)
+        reference_id: Optional related entity ID
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            fields = {
+                "user_id": user_id,
+                "points": str(points),
+                "action_type": action_type,
+                "created_at": datetime.utcnow().isoformat()
+            }
+            if reference_id:
+                fields["reference_id"] = reference_id
+            # The stream entry is the commit point: append it first, so a
+            # failure falls through to the direct insert without leaving a
+            # stranded pending-counter increment that nothing ever flushes
+            await client.xadd(POINTS_STREAM, fields)
+            try:
+                await client.incrby(f"points:{user_id}", points)
+            except Exception as e:
+                # The event is already durable in the stream; the live
+                # total just understates until the next flush
+                logger.warning("Pending points counter bump failed: {}", e)
+            await invalidate_user_stats(user_id)
+            return
+        except Exception as e:
+            logger.warning("Redis points buffer failed, writing directly: {}", e)
+
+    # No Redis (or it failed): write the row directly as before;
+    # created_at comes from the column default. The buffered path above
+    # still records the award time explicitly because its row is only
+    # inserted when the stream is flushed, possibly much later.
+    row = {
+        "user_id": user_id,
+        "points": points,
+        "action_type": action_type,
+    }
+    if reference_id:
+        row["reference_id"] = reference_id
+    supabase = get_supabase_client()
+    await run_db(supabase.table("user_points").insert(row).execute)
+    await invalidate_user_stats(user_id)
+
+
+async def pending_points(user_id: str) -> int:
+    """Points awarded but not yet flushed to the database"""
+    client = get_redis()
+    if client is None:
+        return 0
+    try:
+        value = await client.get(f"points:{user_id}")
+        # Clamp: a missed counter bump followed by a flush can leave the
+        # key slightly negative, which must not subtract from stats
+        return max(0, int(value or 0))
+    except Exception as e:
+        logger.warning("Redis pending points read failed: {}", e)
+        return 0
+
+
+async def _ensure_flush_group(client) -> None:
+    """Create the flusher consumer group if it does not exist yet"""
+    try:
+        await client.xgroup_create(POINTS_STREAM, POINTS_FLUSH_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        # BUSYGROUP means another worker created it first
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def flush_points_events() -> int:
+    """Drain buffered point events into user_points in one bulk insert
+
+    Reads through a consumer group so that with several worker processes
+    each event is delivered to exactly one flusher; without a group,
+    concurrent workers would insert the same entries twice and drive the
+    pending counters negative. Entries are acknowledged and deleted only
+    after the insert succeeds, and entries stranded by a dead worker are
+    reclaimed once they sit unacknowledged for a minute.
+
+    Returns the number of events flushed.
+    """
+    client = get_redis()
+    if client is None:
+        return 0
+
+    await _ensure_flush_group(client)
+    consumer = f"flusher-{os.getpid()}"
+
+    # First reclaim anything a crashed flusher read but never acknowledged
+    entries = []
+    try:
+        claimed = await client.xautoclaim(
+            POINTS_STREAM, POINTS_FLUSH_GROUP, consumer,
+            min_idle_time=PENDING_CLAIM_IDLE_MS, count=FLUSH_BATCH_SIZE
+        )
+        entries.extend(claimed[1])
+    except Exception as e:
+        logger.warning("Reclaiming pending point events failed: {}", e)
+
+    if len(entries) < FLUSH_BATCH_SIZE:
+        response = await client.xreadgroup(
+            POINTS_FLUSH_GROUP, consumer,
+            {POINTS_STREAM: ">"}, count=FLUSH_BATCH_SIZE - len(entries)
+        )
+        if response:
+            entries.extend(response[0][1])
+
+    if not entries:
+        return 0
+
+    rows = []
+    flushed_by_user = {}
+    for _entry_id, fields in entries:
+        if not fields:
+            # Tombstone of an entry deleted from the stream; ack it below
+            continue
+        decoded = {
+            (k.decode() if isinstance(k, bytes) else k):
+            (v.decode() if isinstance(v, bytes) else v)
+            for k, v in fields.items()
+        }
+        points = int(decoded["points"])
+        row = {
+            "user_id": decoded["user_id"],
+            "points": points,
+            "action_type": decoded["action_type"],
+            "created_at": decoded["created_at"]
+        }
+        if decoded.get("reference_id"):
+            row["reference_id"] = decoded["reference_id"]
+        rows.append(row)
+        flushed_by_user[decoded["user_id"]] = flushed_by_user.get(decoded["user_id"], 0) + points
+
+    if rows:
+        supabase = get_supabase_client()
+        await run_db(supabase.table("user_points").insert(rows).execute)
+
+    # Only acknowledge events and drop pending counters once the insert
+    # succeeded; a failure leaves them pending for the next pass
+    entry_ids = [entry_id for entry_id, _ in entries]
+    await client.xack(POINTS_STREAM, POINTS_FLUSH_GROUP, *entry_ids)
+    await client.xdel(POINTS_STREAM, *entry_ids)
+    for user_id, points in flushed_by_user.items():
+        await client.decrby(f"points:{user_id}", points)
+
+    logger.info("Flushed {} buffered point events for {} users", len(rows), len(flushed_by_user))
+    return len(rows)
+
+
+async def points_flush_loop() -> None:
+    """Background task draining the points buffer every few seconds"""
+    while True:
+        try:
+            await flush_points_events()
+        except asyncio.CancelledError:
+            # Final best-effort drain so buffered points survive shutdown
+            try:
+                await flush_points_events()
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            logger.error("Points flush failed: {}", e)
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
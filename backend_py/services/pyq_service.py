@@ -3,9 +3,9 @@ PYQ (Previous Year Questions) Service using Gemini AI
 Generates exam-style questions and evaluates student answers
 """
 
-import json
+import orjson
 from typing import List, Dict
-from .gemini import GeminiService
+from .gemini import GeminiService, extract_json_payload
 from ..utils.logger import get_logger
 import uuid
 
@@ -69,19 +69,11 @@ Format as JSON array with this exact structure:
 
 Make questions realistic and exam-worthy. Return ONLY the JSON array."""
             
-            response = await self.gemini.generate_content(prompt)
-            
-            # Clean and parse JSON
-            json_text = response.strip()
-            if json_text.startswith("```json"):
-                json_text = json_text[7:]
-            if json_text.startswith("```"):
-                json_text = json_text[3:]
-            if json_text.endswith("```"):
-                json_text = json_text[:-3]
-            json_text = json_text.strip()
-            
-            questions = json.loads(json_text)
+            response = await self.gemini.generate_content(prompt, json_response=True)
+
+            # JSON mode returns a bare document; the shared extractor is a
+            # no-op safety net for any stray fences
+            questions = orjson.loads(extract_json_payload(response))
             
             # Validate and add unique IDs
             validated_questions = []
@@ -97,7 +89,7 @@ Make questions realistic and exam-worthy. Return ONLY the JSON array."""
             logger.info(f"Successfully generated {len(validated_questions)} questions")
             return validated_questions
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON response: {str(e)}")
             raise ValueError("Failed to generate questions. Please try again.")
             
@@ -158,19 +150,9 @@ Be fair but constructive in evaluation. Consider:
 
 Return ONLY the JSON object."""
             
-            response = await self.gemini.generate_content(prompt)
-            
-            # Clean and parse JSON
-            json_text = response.strip()
-            if json_text.startswith("```json"):
-                json_text = json_text[7:]
-            if json_text.startswith("```"):
-                json_text = json_text[3:]
-            if json_text.endswith("```"):
-                json_text = json_text[:-3]
-            json_text = json_text.strip()
-            
-            evaluation = json.loads(json_text)
+            response = await self.gemini.generate_content(prompt, json_response=True)
+
+            evaluation = orjson.loads(extract_json_payload(response))
             
             # Validate structure
             required_fields = ["score", "max_score", "feedback", "strengths", "improvements"]
@@ -185,7 +167,7 @@ Return ONLY the JSON object."""
             logger.info(f"Evaluation completed. Score: {evaluation['score']}/{evaluation['max_score']}")
             return evaluation
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse evaluation JSON: {str(e)}")
             raise ValueError("Failed to evaluate answer. Please try again.")
             
@@ -224,17 +206,9 @@ Hints should:
 
 Return as JSON array: ["Hint 1", "Hint 2", "Hint 3"]"""
             
-            response = await self.gemini.generate_content(prompt)
-            
-            json_text = response.strip()
-            if json_text.startswith("```json"):
-                json_text = json_text[7:]
-            if json_text.startswith("```"):
-                json_text = json_text[3:]
-            if json_text.endswith("```"):
-                json_text = json_text[:-3]
-            
-            hints = json.loads(json_text.strip())
+            response = await self.gemini.generate_content(prompt, json_response=True)
+
+            hints = orjson.loads(extract_json_payload(response))
             
             logger.info(f"Generated {len(hints)} hints")
             return hints if isinstance(hints, list) else []
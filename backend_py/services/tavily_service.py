@@ -36,8 +36,11 @@ class TavilyResourceService:
             # Build enhanced query with context
             enhanced_query = self._build_enhanced_query(query, subject, difficulty, resource_type)
             
-            # Search with Tavily
-            search_results = self.client.search(
+            # The Tavily client is synchronous; run it on a worker thread
+            # (same pattern as run_db) so the event loop keeps serving and
+            # gathered searches actually overlap
+            search_results = await asyncio.to_thread(
+                self.client.search,
                 query=enhanced_query,
                 max_results=max_results,
                 search_depth="advanced",
@@ -0,0 +1,77 @@
+"""
+Redis-backed response cache for hot read endpoints
+
+The cache is strictly an optimization: when REDIS_URL is not configured
+or Redis is unreachable, callers fall through to computing the value
+directly, so local development needs no Redis at all.
+"""
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; the cache simply stays disabled
+    aioredis = None
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+_redis_client = None
+
+
+def get_redis():
+    """Get the shared Redis client, or None when caching is disabled"""
+    global _redis_client
+    if _redis_client is None and aioredis is not None:
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            _redis_client = aioredis.from_url(redis_url)
+            logger.info("Redis cache enabled")
+    return _redis_client
+
+
+async def cached(key: str, ttl: int, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the JSON-cached value for key, computing and storing on miss
+
+    Args:
+        key: Cache key
+        ttl: Expiry in seconds
+        compute: Zero-arg coroutine function producing the value on a miss
+    """
+    client = get_redis()
+    if client is None:
+        return await compute()
+
+    try:
+        raw = await client.get(key)
+        if raw is not None:
+            return orjson.loads(raw)
+    except Exception as e:
+        logger.warning("Redis read failed for {}: {}", key, e)
+        return await compute()
+
+    value = await compute()
+    try:
+        await client.set(key, orjson.dumps(value), ex=ttl)
+    except Exception as e:
+        logger.warning("Redis write failed for {}: {}", key, e)
+    return value
+
+
+async def invalidate(*keys: str) -> None:
+    """Drop cache entries; a no-op when caching is disabled"""
+    client = get_redis()
+    if client is None or not keys:
+        return
+    try:
+        await client.delete(*keys)
+    except Exception as e:
+        logger.warning("Redis invalidation failed for {}: {}", keys, e)
+
+
+async def invalidate_user_stats(user_id: str) -> None:
+    """Invalidate the cached gamification stats after a points write"""
+    await invalidate(f"stats:{user_id}")
@@ -0,0 +1,10 @@
+"""
+Request-scoped context shared across the backend
+
+Holds the per-request id set by the logging middleware so any log line
+emitted while handling a request can be correlated without passing the
+id through every call.
+"""
+import contextvars
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
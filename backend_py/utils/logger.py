@@ -2,34 +2,44 @@ import sys
 from loguru import logger
 import os
 from datetime import datetime
+from .context import request_id_var
+
+
+def _inject_request_id(record):
+    """Attach the current request id so every log line can be correlated"""
+    record["extra"]["request_id"] = request_id_var.get()
+
 
 def setup_logger():
     """Setup comprehensive logging configuration"""
-    
+
     # Remove default handler
     logger.remove()
-    
+
+    # Stamp each record with the request id from the middleware
+    logger.configure(patcher=_inject_request_id)
+
     # Console logging with colors
     logger.add(
         sys.stdout,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <magenta>{extra[request_id]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
         level="INFO",
         colorize=True
     )
-    
+
     # File logging for errors
     logger.add(
         "logs/error.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}",
         level="ERROR",
         rotation="10 MB",
         retention="30 days"
     )
-    
+
     # File logging for all logs
     logger.add(
         "logs/app.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}",
         level="DEBUG",
         rotation="50 MB",
         retention="7 days"
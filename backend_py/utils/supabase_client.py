@@ -1,5 +1,7 @@
+import asyncio
 from functools import lru_cache
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
 try:
     # preferred relative import when running as a package
     from .config import get_settings
@@ -26,4 +28,22 @@ def get_supabase_client() -> Client:
             "Invalid SUPABASE_URL. Expected the Supabase project URL like 'https://<ref>.supabase.co', not a database connection string."
         )
 
-    return create_client(url, key)
+    # lru_cache makes this a process-wide singleton, so the underlying
+    # httpx sessions (and their kept-alive TLS connections) are reused
+    # across requests instead of re-handshaking per call. Explicit
+    # timeouts stop a hung upstream from pinning pooled connections.
+    options = ClientOptions(
+        postgrest_client_timeout=10,
+        storage_client_timeout=30,
+    )
+    return create_client(url, key, options=options)
+
+
+async def run_db(call):
+    """Run a blocking Supabase SDK call in a worker thread.
+
+    The supabase-py client is synchronous; calling it directly inside an
+    async handler blocks the event loop for the full HTTP round-trip.
+    Usage: result = await run_db(lambda: supabase.table(...).execute())
+    """
+    return await asyncio.to_thread(call)
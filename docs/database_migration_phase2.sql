@@ -0,0 +1,572 @@
+-- ============================================
+-- Phase 2: Performance Helpers
+-- SQL functions and indexes backing the aggregated queries used by the
+-- gamification, flashcard and stats endpoints
+-- ============================================
+
+-- ============================================
+-- 1. Achievement counters
+-- ============================================
+-- Returns every counter the achievement checks need in one round-trip
+-- instead of one COUNT query per achievement.
+CREATE OR REPLACE FUNCTION get_achievement_counters(p_user_id UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'notes_count', (SELECT count(*) FROM notes WHERE user_id = p_user_id),
+        'pyq_count', (SELECT count(*) FROM pyq_submissions WHERE user_id = p_user_id),
+        'flashcards_count', (SELECT count(*) FROM flashcards WHERE user_id = p_user_id),
+        'streak', (
+            WITH days AS (
+                SELECT DISTINCT created_at::date AS d
+                FROM study_sessions
+                WHERE user_id = p_user_id
+            ),
+            ranked AS (
+                SELECT d, row_number() OVER (ORDER BY d DESC) AS rn
+                FROM days
+            )
+            SELECT count(*)
+            FROM ranked
+            WHERE d = (SELECT max(d) FROM days) - (rn - 1)
+              AND (SELECT max(d) FROM days) >= current_date - 1
+        )
+    );
+$$ LANGUAGE sql STABLE;
+
+-- ============================================
+-- 2. Scalar aggregates for stats endpoints
+-- ============================================
+-- Total points for a user; replaces pulling every user_points row just
+-- to sum it in Python.
+CREATE OR REPLACE FUNCTION get_user_points_total(p_user_id UUID)
+RETURNS BIGINT AS $$
+    SELECT COALESCE(sum(points), 0) FROM user_points WHERE user_id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+-- All flashcard statistics in one scan; replaces fetching every card.
+CREATE OR REPLACE FUNCTION get_flashcard_aggregate_stats(p_user_id UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'total_flashcards', count(*),
+        'total_reviews', COALESCE(sum(review_count), 0),
+        'average_accuracy', CASE
+            WHEN COALESCE(sum(review_count), 0) > 0
+            THEN sum(correct_count)::float / sum(review_count) * 100
+            ELSE 0
+        END,
+        'due_today', count(*) FILTER (WHERE next_review_date <= now()),
+        'mastered', count(*) FILTER (
+            WHERE review_count >= 5
+              AND correct_count::float / review_count > 0.8
+        )
+    )
+    FROM flashcards
+    WHERE user_id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================
+-- 3. Leaderboard
+-- ============================================
+-- Aggregated points, email and streak for the top users in one call;
+-- replaces one users lookup plus one streak scan per leaderboard rank.
+-- p_since is NULL for the all-time board.
+CREATE OR REPLACE FUNCTION get_leaderboard(p_since TIMESTAMPTZ, p_limit INT)
+RETURNS JSON AS $$
+    WITH totals AS (
+        SELECT user_id, sum(points) AS points
+        FROM user_points
+        WHERE p_since IS NULL OR created_at >= p_since
+        GROUP BY user_id
+        ORDER BY points DESC
+        LIMIT p_limit
+    ),
+    streaks AS (
+        SELECT t.user_id,
+               (
+                   WITH days AS (
+                       SELECT DISTINCT s.created_at::date AS d
+                       FROM study_sessions s
+                       WHERE s.user_id = t.user_id
+                   ),
+                   ranked AS (
+                       SELECT d, row_number() OVER (ORDER BY d DESC) AS rn
+                       FROM days
+                   )
+                   SELECT count(*)
+                   FROM ranked
+                   WHERE d = (SELECT max(d) FROM days) - (rn - 1)
+                     AND (SELECT max(d) FROM days) >= current_date - 1
+               ) AS streak
+        FROM totals t
+    )
+    SELECT COALESCE(json_agg(json_build_object(
+        'user_id', t.user_id,
+        'email', u.email,
+        'points', t.points,
+        'streak', COALESCE(s.streak, 0)
+    ) ORDER BY t.points DESC), '[]'::json)
+    FROM totals t
+    LEFT JOIN users u ON u.id = t.user_id
+    LEFT JOIN streaks s ON s.user_id = t.user_id;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================
+-- 4. Streak
+-- ============================================
+-- Current consecutive-day study streak as one integer; replaces fetching
+-- the last 100 study_sessions rows and walking them in Python. Shares
+-- its logic with get_achievement_counters and get_leaderboard above.
+CREATE OR REPLACE FUNCTION get_streak(p_user_id UUID)
+RETURNS INT AS $$
+    WITH days AS (
+        SELECT DISTINCT created_at::date AS d
+        FROM study_sessions
+        WHERE user_id = p_user_id
+    ),
+    ranked AS (
+        SELECT d, row_number() OVER (ORDER BY d DESC) AS rn
+        FROM days
+    )
+    SELECT count(*)::int
+    FROM ranked
+    WHERE d = (SELECT max(d) FROM days) - (rn - 1)
+      AND (SELECT max(d) FROM days) >= current_date - 1;
+$$ LANGUAGE sql STABLE;
+
+-- ============================================
+-- 5. Composite indexes for hot queries
+-- ============================================
+-- Due-card lookups: user_id = ? AND next_review_date <= now()
+-- ORDER BY next_review_date (flashcards /due endpoint)
+CREATE INDEX IF NOT EXISTS flashcards_user_due_idx
+    ON flashcards(user_id, next_review_date);
+
+-- Paged listing: user_id = ? ORDER BY created_at DESC (flashcards /all)
+CREATE INDEX IF NOT EXISTS flashcards_user_created_idx
+    ON flashcards(user_id, created_at DESC);
+
+-- Points aggregation by user and time window; INCLUDE (points) lets the
+-- leaderboard and totals queries run as index-only scans
+CREATE INDEX IF NOT EXISTS user_points_user_created_idx
+    ON user_points(user_id, created_at DESC) INCLUDE (points);
+
+-- Streak and session-bucket queries scan study_sessions by user and time
+CREATE INDEX IF NOT EXISTS study_sessions_user_created_idx
+    ON study_sessions(user_id, created_at DESC);
+
+-- ============================================
+-- 6. Study time buckets
+-- ============================================
+-- Today's and the trailing week's study seconds in one scan; replaces
+-- two separate study_sessions range queries in the stats endpoint.
+CREATE OR REPLACE FUNCTION study_time_buckets(p_user_id UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'today_seconds', COALESCE(sum(duration_seconds) FILTER (
+            WHERE created_at >= current_date), 0),
+        'week_seconds', COALESCE(sum(duration_seconds), 0)
+    )
+    FROM study_sessions
+    WHERE user_id = p_user_id
+      AND created_at >= now() - interval '7 days';
+$$ LANGUAGE sql STABLE;
+
+-- ============================================
+-- 7. Flashcard review
+-- ============================================
+-- Atomic review update: increments counters and sets the next review
+-- date in one statement, returning the updated row. Replaces the
+-- SELECT-then-UPDATE pair in the review endpoint and removes its
+-- read-modify-write race. An empty result means not found / not owned.
+CREATE OR REPLACE FUNCTION review_flashcard(
+    p_flashcard_id UUID,
+    p_user_id UUID,
+    p_is_correct BOOLEAN,
+    p_next_review TIMESTAMPTZ,
+    p_reviewed_at TIMESTAMPTZ
+)
+RETURNS SETOF flashcards AS $$
+    UPDATE flashcards
+    SET review_count = review_count + 1,
+        correct_count = correct_count + p_is_correct::int,
+        next_review_date = p_next_review,
+        last_reviewed = p_reviewed_at
+    WHERE id = p_flashcard_id
+      AND user_id = p_user_id
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- 8. Spaced-repetition state
+-- ============================================
+-- Persist SM-2 state per card; previously the interval was hardcoded to
+-- 1 in the API, so every card came back the next day regardless of
+-- performance.
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS interval_days INT DEFAULT 1;
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS ease_factor REAL DEFAULT 2.5;
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS repetitions INT DEFAULT 0;
+
+-- Recreate review_flashcard to compute the SM-2 transition server-side
+-- from the stored state; the signature changes, so drop the old one.
+DROP FUNCTION IF EXISTS review_flashcard(UUID, UUID, BOOLEAN, TIMESTAMPTZ, TIMESTAMPTZ);
+
+CREATE OR REPLACE FUNCTION review_flashcard(
+    p_flashcard_id UUID,
+    p_user_id UUID,
+    p_performance TEXT,
+    p_reviewed_at TIMESTAMPTZ
+)
+RETURNS SETOF flashcards AS $$
+DECLARE
+    v_card flashcards;
+    v_interval INT;
+    v_ease REAL;
+    v_reps INT;
+BEGIN
+    SELECT * INTO v_card
+    FROM flashcards
+    WHERE id = p_flashcard_id AND user_id = p_user_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    v_ease := COALESCE(v_card.ease_factor, 2.5);
+    v_reps := COALESCE(v_card.repetitions, 0);
+    v_interval := COALESCE(v_card.interval_days, 1);
+
+    IF p_performance = 'again' THEN
+        v_reps := 0;
+        v_interval := 1;
+        v_ease := GREATEST(1.3, v_ease - 0.2);
+    ELSIF p_performance = 'hard' THEN
+        v_ease := GREATEST(1.3, v_ease - 0.15);
+        v_interval := GREATEST(1, round(v_interval * 1.2)::int);
+    ELSE
+        v_reps := v_reps + 1;
+        IF p_performance = 'easy' THEN
+            v_ease := v_ease + 0.15;
+        END IF;
+        IF v_reps = 1 THEN
+            v_interval := 1;
+        ELSIF v_reps = 2 THEN
+            v_interval := 6;
+        ELSE
+            v_interval := GREATEST(1, round(v_interval * v_ease)::int);
+        END IF;
+        IF p_performance = 'easy' THEN
+            v_interval := GREATEST(1, round(v_interval * 1.3)::int);
+        END IF;
+    END IF;
+
+    RETURN QUERY
+    UPDATE flashcards
+    SET review_count = review_count + 1,
+        correct_count = correct_count + (p_performance IN ('good', 'easy'))::int,
+        repetitions = v_reps,
+        ease_factor = v_ease,
+        interval_days = v_interval,
+        next_review_date = p_reviewed_at + v_interval * interval '1 day',
+        last_reviewed = p_reviewed_at
+    WHERE id = p_flashcard_id AND user_id = p_user_id
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- 9. Note search
+-- ============================================
+-- Trigram indexes let the ilike search in /api/notes/search run as an
+-- index lookup instead of a sequential scan over every note.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS notes_title_trgm
+    ON notes USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS notes_content_trgm
+    ON notes USING gin (content gin_trgm_ops);
+
+-- ============================================
+-- 10. Progress stats
+-- ============================================
+-- Per-subject totals and the grand total in one aggregate; replaces
+-- fetching every study_sessions row to sum in Python.
+CREATE OR REPLACE FUNCTION get_progress_stats(p_user_id UUID)
+RETURNS JSON AS $$
+    WITH per_subject AS (
+        SELECT COALESCE(subject, 'General') AS subject,
+               sum(duration_seconds)::bigint AS total_seconds
+        FROM study_sessions
+        WHERE user_id = p_user_id
+        GROUP BY 1
+    )
+    SELECT json_build_object(
+        'total_seconds', COALESCE((SELECT sum(total_seconds) FROM per_subject), 0),
+        'subject_breakdown', COALESCE(
+            (SELECT json_object_agg(subject, total_seconds) FROM per_subject),
+            '{}'::json
+        )
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Lets the aggregate run as an index-only scan
+CREATE INDEX IF NOT EXISTS study_sessions_user_subject_idx
+    ON study_sessions(user_id, subject) INCLUDE (duration_seconds);
+
+-- ============================================
+-- 11. Session end
+-- ============================================
+-- Close a session and compute its duration in one statement; replaces a
+-- SELECT + Python timestamp math + UPDATE. Empty result = not found.
+CREATE OR REPLACE FUNCTION end_study_session(p_session_id UUID, p_user_id UUID)
+RETURNS TABLE(session_id UUID, duration_seconds INT) AS $$
+    UPDATE study_sessions
+    SET ended_at = now(),
+        duration_seconds = GREATEST(0, EXTRACT(EPOCH FROM now() - started_at))::int
+    WHERE id = p_session_id
+      AND user_id = p_user_id
+      AND started_at IS NOT NULL
+    RETURNING id, duration_seconds;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- 12. Plan progress
+-- ============================================
+-- Merge one day's completion flag into the progress JSONB in place;
+-- replaces the read-modify-write cycle that could clobber concurrent
+-- updates to other days. Empty result = not found / not owned.
+CREATE OR REPLACE FUNCTION update_plan_day(
+    p_plan_id UUID,
+    p_user_id UUID,
+    p_day TEXT,
+    p_done BOOLEAN
+)
+RETURNS TABLE(progress JSONB) AS $$
+    UPDATE study_plans
+    SET progress = jsonb_set(
+        COALESCE(study_plans.progress, '{}'::jsonb),
+        ARRAY[p_day],
+        to_jsonb(p_done)
+    )
+    WHERE id = p_plan_id
+      AND user_id = p_user_id
+    RETURNING study_plans.progress;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- 13. OCR save
+-- ============================================
+-- Insert the OCR extraction and (optionally) its note in one transaction
+-- and one network call; word count is computed server-side.
+CREATE OR REPLACE FUNCTION save_ocr_and_note(
+    p_user_id UUID,
+    p_text TEXT,
+    p_image_url TEXT,
+    p_subject TEXT,
+    p_topic TEXT,
+    p_confidence FLOAT,
+    p_note_title TEXT,
+    p_note_tags TEXT[],
+    p_auto_note BOOLEAN
+)
+RETURNS TABLE(ocr_id UUID, note_id UUID, word_count INT) AS $$
+DECLARE
+    v_ocr_id UUID;
+    v_note_id UUID;
+    v_word_count INT;
+BEGIN
+    -- word_count is a generated column (section 16); read it back rather
+    -- than computing and inserting it
+    INSERT INTO ocr_extractions (
+        user_id, extracted_text, image_url, subject, topic,
+        confidence, created_at
+    )
+    VALUES (
+        p_user_id, p_text, p_image_url, p_subject, p_topic,
+        p_confidence, now()
+    )
+    RETURNING id, ocr_extractions.word_count INTO v_ocr_id, v_word_count;
+
+    IF p_auto_note THEN
+        INSERT INTO notes (user_id, title, content, subject, tags, created_at, updated_at)
+        VALUES (p_user_id, p_note_title, p_text, p_subject, p_note_tags, now(), now())
+        RETURNING id INTO v_note_id;
+    END IF;
+
+    RETURN QUERY SELECT v_ocr_id, v_note_id, v_word_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- 14. Database-generated ids
+-- ============================================
+-- Let Postgres mint ids so inserts don't need a Python uuid4 and the
+-- generated id comes back via the insert's returned row.
+ALTER TABLE notes ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE study_plans ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE study_sessions ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE ocr_extractions ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE flashcards ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE chat_messages ALTER COLUMN id SET DEFAULT gen_random_uuid();
+
+-- ============================================
+-- 15. Listing pagination
+-- ============================================
+-- Composite indexes serving the keyset-paginated note and plan listings
+-- (user_id = ? AND created_at < cursor ORDER BY created_at DESC)
+CREATE INDEX IF NOT EXISTS notes_user_created_idx
+    ON notes(user_id, created_at DESC, id);
+CREATE INDEX IF NOT EXISTS study_plans_user_created_idx
+    ON study_plans(user_id, created_at DESC, id);
+
+-- ============================================
+-- 16. Generated word count
+-- ============================================
+-- word_count is derived entirely from extracted_text, so let Postgres
+-- maintain it as a generated column: computed once on write, free on
+-- every read, and impossible for writers to get out of sync.
+ALTER TABLE ocr_extractions DROP COLUMN IF EXISTS word_count;
+ALTER TABLE ocr_extractions ADD COLUMN word_count INT GENERATED ALWAYS AS (
+    COALESCE(array_length(regexp_split_to_array(trim(extracted_text), '\s+'), 1), 0)
+) STORED;
+
+-- ============================================
+-- 17. Remaining per-user listing indexes
+-- ============================================
+-- Sections 5 and 15 already cover flashcards, user_points, study_sessions,
+-- notes and study_plans by (user_id, created_at DESC). Two hot paths
+-- remain: the subject-filtered notes listing and the OCR history page.
+CREATE INDEX IF NOT EXISTS notes_user_subject_created_idx
+    ON notes(user_id, subject, created_at DESC);
+CREATE INDEX IF NOT EXISTS ocr_user_created_idx
+    ON ocr_extractions(user_id, created_at DESC);
+
+-- Optional, run during a maintenance window: physically order notes by
+-- the per-user listing index for better locality on cold scans. CLUSTER
+-- takes an ACCESS EXCLUSIVE lock and is not maintained on later writes,
+-- so it must be repeated periodically to keep paying off.
+-- CLUSTER notes USING notes_user_created_idx;
+
+-- ============================================
+-- 18. Plan insert from raw JSON
+-- ============================================
+-- The planner hands over Gemini's cleaned JSON output as-is and Postgres
+-- parses it once; the API process no longer re-serializes the whole plan
+-- structure into the insert body.
+CREATE OR REPLACE FUNCTION create_study_plan(
+    p_user_id UUID,
+    p_subjects TEXT[],
+    p_hours INT,
+    p_difficulty TEXT,
+    p_focus TEXT[],
+    p_plan_json TEXT
+)
+RETURNS UUID AS $$
+    WITH parsed AS (
+        SELECT p_plan_json::jsonb AS plan
+    )
+    INSERT INTO study_plans (
+        user_id, subjects, study_hours_per_week, difficulty_level,
+        focus_areas, schedule, milestones, progress, status, created_at
+    )
+    SELECT p_user_id, p_subjects, p_hours, p_difficulty, p_focus,
+           plan->'weeks',
+           COALESCE(plan->'milestones', '[]'::jsonb),
+           '{}'::jsonb, 'active', now()
+    FROM parsed
+    RETURNING id;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- 19. Soft deletes
+-- ============================================
+-- Deletes become a single-column UPDATE (HOT path, no index maintenance)
+-- and can be batched; partial indexes keep live-row listings as fast as
+-- before. Hard deletion happens out of band (see the purge note below).
+ALTER TABLE notes ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+ALTER TABLE study_plans ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+ALTER TABLE ocr_extractions ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS notes_live_idx
+    ON notes(user_id, created_at DESC) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS study_plans_live_idx
+    ON study_plans(user_id, created_at DESC) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS ocr_live_idx
+    ON ocr_extractions(user_id, created_at DESC) WHERE deleted_at IS NULL;
+
+-- Purge job: run nightly (pg_cron or an external scheduler) to reclaim
+-- rows soft-deleted more than 30 days ago; autovacuum reclaims the space.
+-- DELETE FROM notes            WHERE deleted_at < now() - interval '30 days';
+-- DELETE FROM study_plans     WHERE deleted_at < now() - interval '30 days';
+-- DELETE FROM ocr_extractions WHERE deleted_at < now() - interval '30 days';
+
+-- ============================================
+-- 20. PYQ stats
+-- ============================================
+-- Totals, per-subject breakdown and the five most recent submissions in
+-- one call; replaces fetching every submission row to reduce in Python.
+CREATE OR REPLACE FUNCTION get_pyq_stats(p_user_id UUID)
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'total_submissions', count(*),
+        'total_score', COALESCE(sum(score), 0),
+        'total_max_score', COALESCE(sum(max_score), 0),
+        'subject_performance', COALESCE((
+            SELECT json_object_agg(subject, json_build_object(
+                'count', cnt,
+                'total_score', s,
+                'total_max_score', m,
+                'percentage', CASE WHEN m > 0
+                    THEN round(s::numeric / m * 100, 2) ELSE 0 END
+            ))
+            FROM (
+                SELECT subject, count(*) AS cnt,
+                       sum(score) AS s, sum(max_score) AS m
+                FROM pyq_submissions
+                WHERE user_id = p_user_id
+                GROUP BY subject
+            ) per_subject
+        ), '{}'::json),
+        'recent_submissions', COALESCE((
+            SELECT json_agg(recent)
+            FROM (
+                SELECT score, max_score, subject, created_at
+                FROM pyq_submissions
+                WHERE user_id = p_user_id
+                ORDER BY created_at DESC
+                LIMIT 5
+            ) recent
+        ), '[]'::json)
+    )
+    FROM pyq_submissions
+    WHERE user_id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+-- Serves the stats scan, the recent-five lookup and the paged histories
+CREATE INDEX IF NOT EXISTS pyq_submissions_user_created_idx
+    ON pyq_submissions(user_id, created_at DESC);
+
+-- ============================================
+-- 21. Database-side created_at
+-- ============================================
+-- Let the database clock stamp new rows so writers stop formatting and
+-- shipping an ISO timestamp per row (N per batched question upsert).
+ALTER TABLE pyq_questions ALTER COLUMN created_at SET DEFAULT now();
+ALTER TABLE pyq_submissions ALTER COLUMN created_at SET DEFAULT now();
+ALTER TABLE user_points ALTER COLUMN created_at SET DEFAULT now();
+
+-- ============================================
+-- 22. PYQ history indexes
+-- ============================================
+-- The history endpoints run WHERE user_id = ? [AND subject = ?]
+-- ORDER BY created_at DESC LIMIT/OFFSET; these let the planner do an
+-- index range scan with LIMIT pushdown and no sort node.
+-- (pyq_submissions_user_created_idx already exists, section 20. On a
+-- live database, run these with CREATE INDEX CONCURRENTLY to avoid
+-- blocking writes during the build.)
+CREATE INDEX IF NOT EXISTS pyq_questions_user_created_idx
+    ON pyq_questions(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS pyq_questions_user_subject_idx
+    ON pyq_questions(user_id, subject, created_at DESC);
+CREATE INDEX IF NOT EXISTS pyq_submissions_user_subject_idx
+    ON pyq_submissions(user_id, subject, created_at DESC);
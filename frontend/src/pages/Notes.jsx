@@ -25,7 +25,7 @@ const Notes = () => {
   const fetchNotes = async () => {
     try {
       const response = await api.get('/api/notes')
-      setNotes(response.data)
+      setNotes(response.data.notes || [])
     } catch (error) {
       console.error('Error fetching notes:', error)
       toast.error('Failed to load notes')
@@ -25,9 +25,10 @@ const Planner = () => {
   const fetchPlans = async () => {
     try {
       const response = await api.get('/api/planner/plans')
-      setPlans(response.data)
-      if (response.data.length > 0) {
-        setActivePlan(response.data[0])
+      const fetchedPlans = response.data.plans || []
+      setPlans(fetchedPlans)
+      if (fetchedPlans.length > 0) {
+        setActivePlan(fetchedPlans[0])
       }
     } catch (error) {
       console.error('Error fetching plans:', error)